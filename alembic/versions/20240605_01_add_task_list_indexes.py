@@ -0,0 +1,29 @@
+"""
+Add composite indexes backing the public task list filters.
+"""
+from alembic import op
+
+revision = "20240605_01"
+down_revision = "20240604_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_task_list",
+        "tasks",
+        ["status", "subject", "difficulty", "task_type", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_task_status_subject",
+        "tasks",
+        ["status", "subject"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_task_status_subject", table_name="tasks")
+    op.drop_index("idx_task_list", table_name="tasks")
@@ -0,0 +1,28 @@
+"""
+Add photo_hash to submissions for de-duplicating repeated uploads.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20240605_02"
+down_revision = "20240605_01"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "submissions",
+        sa.Column("photo_hash", sa.String(length=64), nullable=True),
+    )
+    op.create_index(
+        "idx_submission_task_photo_hash",
+        "submissions",
+        ["task_id", "photo_hash"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_submission_task_photo_hash", table_name="submissions")
+    op.drop_column("submissions", "photo_hash")
@@ -0,0 +1,31 @@
+"""
+Store submissions.detailed_analysis as JSONB.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "20240605_03"
+down_revision = "20240605_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "submissions",
+        "detailed_analysis",
+        type_=postgresql.JSONB(),
+        existing_type=sa.JSON(),
+        postgresql_using="detailed_analysis::jsonb",
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "submissions",
+        "detailed_analysis",
+        type_=sa.JSON(),
+        existing_type=postgresql.JSONB(),
+        postgresql_using="detailed_analysis::json",
+    )
@@ -0,0 +1,22 @@
+"""
+Add (user_id, submitted_at) index for keyset pagination of user submissions.
+"""
+from alembic import op
+
+revision = "20240605_04"
+down_revision = "20240605_03"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_submission_user_submitted_at",
+        "submissions",
+        ["user_id", "submitted_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_submission_user_submitted_at", table_name="submissions")
@@ -0,0 +1,31 @@
+"""
+Add transaction indexes backing user history and earned-coins stats.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "20240606_01"
+down_revision = "20240605_04"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_transaction_user_created",
+        "transactions",
+        ["user_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_transaction_user_earned",
+        "transactions",
+        ["user_id", "coins_amount"],
+        unique=False,
+        postgresql_where=sa.text("coins_amount > 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_transaction_user_earned", table_name="transactions")
+    op.drop_index("idx_transaction_user_created", table_name="transactions")
@@ -0,0 +1,29 @@
+"""
+Add pg_trgm GIN indexes backing admin user search (ILIKE '%...%').
+"""
+from alembic import op
+
+revision = "20240606_02"
+down_revision = "20240606_01"
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = ("username", "email", "full_name")
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCH_COLUMNS:
+        op.create_index(
+            f"idx_user_{column}_trgm",
+            "users",
+            [column],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    for column in reversed(SEARCH_COLUMNS):
+        op.drop_index(f"idx_user_{column}_trgm", table_name="users")
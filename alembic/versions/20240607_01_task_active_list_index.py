@@ -0,0 +1,37 @@
+"""
+Replace idx_task_list with a partial index matching the public task list query.
+
+On PostgreSQL get_tasks filters by status = 'ACTIVE' and orders by
+(created_at DESC, id DESC); the old composite index led with status and had
+created_at in fifth position, so it could back neither the filter nor the sort.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "20240607_01"
+down_revision = "20240606_02"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Фильтр активности больше не проверяет status IS NULL на PostgreSQL
+    op.execute("UPDATE tasks SET status = 'ACTIVE' WHERE status IS NULL")
+    op.drop_index("idx_task_list", table_name="tasks")
+    op.create_index(
+        "idx_task_active_recent",
+        "tasks",
+        [sa.text("created_at DESC"), sa.text("id DESC")],
+        unique=False,
+        postgresql_where=sa.text("status = 'ACTIVE'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_task_active_recent", table_name="tasks")
+    op.create_index(
+        "idx_task_list",
+        "tasks",
+        ["status", "subject", "difficulty", "task_type", "created_at"],
+        unique=False,
+    )
@@ -0,0 +1,32 @@
+"""
+Add id to idx_submission_user_submitted_at.
+
+get_my_submissions pages by (submitted_at, id) so that rows sharing the
+boundary timestamp are not skipped; the index now covers the tie-breaker.
+"""
+from alembic import op
+
+revision = "20240607_02"
+down_revision = "20240607_01"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index("idx_submission_user_submitted_at", table_name="submissions")
+    op.create_index(
+        "idx_submission_user_submitted_at",
+        "submissions",
+        ["user_id", "submitted_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_submission_user_submitted_at", table_name="submissions")
+    op.create_index(
+        "idx_submission_user_submitted_at",
+        "submissions",
+        ["user_id", "submitted_at"],
+        unique=False,
+    )
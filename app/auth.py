@@ -1,6 +1,7 @@
 """
 Улучшенная аутентификация с refresh токенами и 2FA
 """
+import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status, Request
@@ -23,6 +24,10 @@ from app.database import get_async_db
 from app.models import User, UserRole
 from app.utils.cache import cache_manager
 
+# Шаблоны проверки сложности пароля компилируются один раз при импорте
+PASSWORD_UPPERCASE_RE = re.compile(r'[A-Z]')
+PASSWORD_DIGIT_RE = re.compile(r'\d')
+
 try:  # pragma: no cover - optional dependency
     import bcrypt  # type: ignore
 except ImportError:  # pragma: no cover - handled at runtime
@@ -302,14 +307,27 @@ class AuthService:
             logger.exception("Password hash backend error, using PBKDF2 fallback")
             return _hash_with_pbkdf2(password)
 
+    # bcrypt/PBKDF2 занимают десятки-сотни миллисекунд CPU: в async коде
+    # считаем их в пуле потоков, чтобы не блокировать event loop
+
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """verify_password вне event loop."""
+        return await asyncio.to_thread(AuthService.verify_password, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        """get_password_hash вне event loop."""
+        return await asyncio.to_thread(AuthService.get_password_hash, password)
+
     @staticmethod
     def validate_password_strength(password: str) -> tuple[bool, str]:
         """Проверка сложности пароля."""
         if len(password) < settings.PASSWORD_MIN_LENGTH:
             return False, f"Пароль должен быть минимум {settings.PASSWORD_MIN_LENGTH} символов"
-        if settings.PASSWORD_REQUIRE_UPPERCASE and not re.search(r'[A-Z]', password):
+        if settings.PASSWORD_REQUIRE_UPPERCASE and PASSWORD_UPPERCASE_RE.search(password) is None:
             return False, "Пароль должен содержать хотя бы одну заглавную букву"
-        if settings.PASSWORD_REQUIRE_NUMBER and not re.search(r'\d', password):
+        if settings.PASSWORD_REQUIRE_NUMBER and PASSWORD_DIGIT_RE.search(password) is None:
             return False, "Пароль должен содержать хотя бы одну цифру"
         if password.lower() in ['password', '12345678', 'qwerty', 'abc123']:
             return False, "Пароль слишком простой"
@@ -402,7 +420,7 @@ class AuthService:
             )
 
         # проверяем пароль
-        if not AuthService.verify_password(password, user.password_hash):
+        if not await AuthService.verify_password_async(password, user.password_hash):
             user.failed_login_attempts += 1
             if user.failed_login_attempts >= 5:
                 user.locked_until = datetime.utcnow() + timedelta(minutes=30)
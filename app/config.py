@@ -31,10 +31,18 @@ class Settings(BaseSettings):
     DATABASE_POOL_SIZE: int = 20
     DATABASE_MAX_OVERFLOW: int = 40
     DATABASE_POOL_TIMEOUT: int = 30
+    # Кэш скомпилированных SQLAlchemy запросов (на engine)
+    DATABASE_QUERY_CACHE_SIZE: int = 1200
+    # Кэш подготовленных выражений asyncpg (на соединение)
+    DATABASE_STATEMENT_CACHE_SIZE: int = 1024
 
     # Redis
     REDIS_URL: Optional[str] = "redis://localhost:6379/0"
     REDIS_TTL: int = 3600  # 1 час
+    # Локальный кэш процесса перед Redis: горячие ключи без запроса и JSON
+    # декодирования. Другие воркеры видят сброс кэша с задержкой до TTL; 0 - выключен
+    CACHE_LOCAL_TTL: int = 5
+    CACHE_LOCAL_SIZE: int = 1024
 
     # Security
     SECRET_KEY: str = secrets.token_urlsafe(32)
@@ -59,6 +67,9 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-4o"
     OPENAI_MAX_RETRIES: int = 3
     OPENAI_TIMEOUT: int = 30
+    OPENAI_MAX_CONNECTIONS: int = 200  # Одновременные запросы при массовой сдаче работ
+    OPENAI_HTTP_BACKEND: str = "httpx"  # httpx или aiohttp (нужен пакет openai[aiohttp])
+    OPENAI_MAX_CONCURRENCY: int = 32  # Запросов к API одновременно на процесс
 
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10 MB
@@ -70,6 +81,7 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: str = "us-east-1"
+    S3_ENDPOINT_URL: Optional[str] = None  # Для MinIO и других S3-совместимых хранилищ
 
     # Application
     APP_NAME: str = "Education Platform"
@@ -96,8 +108,15 @@ class Settings(BaseSettings):
     # AI Checking
     OCR_LANGUAGE: str = "rus+eng"
     OCR_TIMEOUT: int = 30
+    OCR_ENGINE_MODE: int = 1  # --oem: 1 = только LSTM, без legacy движка
+    OCR_MAX_SIDE: int = 2000  # Большие фото уменьшаются до OCR: Tesseract не точнее, но медленнее
     AI_CHECK_TIMEOUT: int = 60
     AI_TEMPERATURE: float = 0.3
+    AI_VISION_MAX_SIDE: int = 1024  # Максимальная сторона фото для Vision модели
+    # detail для ADVANCED проверок: "low" в разы дешевле и быстрее, но модель видит
+    # фото 512px и мелкий почерк не разбирает. PREMIUM всегда отправляется в "high"
+    AI_VISION_DETAIL: str = "high"
+    AI_CHECKER_THREADS: int = 4  # Потоки для OCR и обработки изображений
 
     # Celery
     CELERY_BROKER_URL: Optional[str] = None
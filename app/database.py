@@ -1,7 +1,7 @@
 """
 Подключение к базе данных с поддержкой async и пулом соединений
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import NullPool
@@ -29,6 +29,16 @@ sync_engine = create_engine(
 
 # Асинхронный engine для основной работы
 async_database_url = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
+
+# Повторяющиеся запросы API не разбираются заново сервером: asyncpg держит
+# подготовленные выражения на каждом соединении пула
+async_connect_args = {}
+if async_database_url.startswith("postgresql+asyncpg://"):
+    async_connect_args = {
+        "statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+    }
+
 async_engine = create_async_engine(
     async_database_url,
     pool_pre_ping=True,
@@ -36,6 +46,9 @@ async_engine = create_async_engine(
     max_overflow=settings.DATABASE_MAX_OVERFLOW,
     pool_timeout=settings.DATABASE_POOL_TIMEOUT,
     echo=settings.DEBUG,
+    connect_args=async_connect_args,
+    # Скомпилированный SQL переиспользуется между запросами
+    query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
     # Используем NullPool для serverless окружений
     poolclass=NullPool if settings.ENVIRONMENT == "production" else None,
 )
@@ -73,6 +86,18 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def use_autocommit(session: AsyncSession) -> None:
+    """
+    Выполнять следующий запрос сессии в режиме AUTOCOMMIT.
+
+    Для одиночных UPDATE/DELETE без многошаговой транзакции: не тратятся
+    круги до БД на BEGIN/COMMIT. Действует до конца текущей транзакции
+    сессии; если транзакция уже начата, ничего не меняет.
+    """
+    if not session.in_transaction():
+        await session.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+
+
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency для получения асинхронной сессии БД
@@ -95,6 +120,9 @@ async def init_db():
     from app.models import Base
 
     async with async_engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Нужно для триграммных индексов поиска пользователей
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         # Создаем таблицы если их нет
         await conn.run_sync(Base.metadata.create_all)
         logger.info("Database initialized successfully")
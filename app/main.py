@@ -26,12 +26,14 @@ from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 from app.config import settings
-from app.database import init_db, close_db, async_engine
+from app.database import init_db, close_db, async_engine, AsyncSessionLocal
 from app.models import Base
 from app.utils.cache import cache_manager
+from app.services.ai_checker import ai_checker
 from app.middleware.logging import LoggingMiddleware
 from app.middleware.rate_limit import RateLimitMiddleware
-from app.utils.logger import setup_logging
+from app.utils.logger import setup_logging, stop_logging
+from app.utils.responses import FastJSONResponse
 
 # Импорт роутеров
 from app.routers import (
@@ -70,6 +72,12 @@ async def lifespan(app: FastAPI):
     await cache_manager.connect()
     if cache_manager.is_connected():
         logger.info("Redis connected")
+        # Прогреваем фильтры заданий, чтобы DISTINCT не выполнялся на первом запросе
+        try:
+            async with AsyncSessionLocal() as db:
+                await tasks.load_task_filters(db)
+        except Exception as exc:
+            logger.warning(f"Task filters warm-up failed: {exc}")
     else:
         logger.warning("Redis not available, running without cache")
 
@@ -96,9 +104,12 @@ async def lifespan(app: FastAPI):
 
     # Закрываем соединения
     await cache_manager.disconnect()
+    await ai_checker.aclose()
     await close_db()
 
     logger.info("Application shutdown complete")
+    # Дописываем очередь логов, пока stdout еще открыт
+    stop_logging()
 
 
 # Создание приложения
@@ -109,6 +120,7 @@ app = FastAPI(
     version=settings.APP_VERSION,
     docs_url="/api/docs" if not settings.is_production else None,
     redoc_url="/api/redoc" if not settings.is_production else None,
+    default_response_class=FastJSONResponse,
     lifespan=lifespan
 )
 
@@ -185,13 +197,6 @@ app.include_router(analytics.router, prefix="/api/analytics", tags=["📊 Analyt
 # Автоматический редирект между /path и /path/
 app.router.redirect_slashes = True
 
-# Временный дамп маршрутов для отладки
-for route in app.router.routes:
-    try:
-        print("ROUTE:", route.path, getattr(route, "methods", None))
-    except Exception:
-        pass
-
 # Статические файлы
 os.makedirs("uploads/submissions", exist_ok=True)
 os.makedirs("static", exist_ok=True)
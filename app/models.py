@@ -3,8 +3,9 @@
 """
 from sqlalchemy import (
     Column, Integer, String, DateTime, ForeignKey, Text, Boolean,
-    Float, JSON, Enum, Index, UniqueConstraint, CheckConstraint
+    Float, JSON, Enum, Index, UniqueConstraint, CheckConstraint, text
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship, validates
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -118,6 +119,15 @@ class User(Base):
         Index('idx_user_email_active', 'email', 'is_active'),
         Index('idx_user_role_active', 'role', 'is_active'),
         Index('idx_user_level_exp', 'level', 'experience'),
+        # Триграммные GIN индексы для поиска ILIKE '%...%' в админке (pg_trgm)
+        *(
+            Index(
+                f'idx_user_{column}_trgm', column,
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'}
+            )
+            for column in ('username', 'email', 'full_name')
+        ),
         CheckConstraint('coins >= 0', name='check_positive_coins'),
         CheckConstraint('level >= 1', name='check_min_level'),
     )
@@ -203,6 +213,16 @@ class Task(Base):
         Index('idx_task_subject_difficulty', 'subject', 'difficulty'),
         Index('idx_task_status_featured', 'status', 'is_featured'),
         Index('idx_task_type_status', 'task_type', 'status'),
+        # Публичный список заданий (get_tasks): на PostgreSQL фильтр активности
+        # сводится к status = 'ACTIVE', а сортировка идет по (created_at, id)
+        Index(
+            'idx_task_active_recent',
+            created_at.desc(),
+            id.desc(),
+            postgresql_where=text("status = 'ACTIVE'"),
+        ),
+        # DISTINCT по предметам для /subjects/list
+        Index('idx_task_status_subject', 'status', 'subject'),
     )
 
 
@@ -218,6 +238,7 @@ class Submission(Base):
     photo_urls = Column(JSON)  # Массив URL для нескольких фото
     photo_filename = Column(String(255))
     file_size = Column(Integer)  # Размер в байтах
+    photo_hash = Column(String(64))  # SHA-256 содержимого фото
 
     # Контент
     recognized_text = Column(Text)
@@ -229,7 +250,7 @@ class Submission(Base):
 
     # AI анализ
     ai_feedback = Column(Text)
-    detailed_analysis = Column(JSON)
+    detailed_analysis = Column(JSON().with_variant(JSONB(), "postgresql"))  # JSONB в PostgreSQL
     confidence_score = Column(Float)  # Уверенность AI в оценке
     plagiarism_score = Column(Float)  # Проверка на плагиат
 
@@ -276,6 +297,8 @@ class Submission(Base):
         Index('idx_submission_user_task', 'user_id', 'task_id'),
         Index('idx_submission_status_score', 'status', 'score'),
         Index('idx_submission_submitted_at', 'submitted_at'),
+        Index('idx_submission_task_photo_hash', 'task_id', 'photo_hash'),
+        Index('idx_submission_user_submitted_at', 'user_id', 'submitted_at', 'id'),
         UniqueConstraint('user_id', 'task_id', 'attempt_number', name='unique_user_task_attempt'),
     )
 
@@ -442,6 +465,10 @@ class Purchase(Base):
         Index('idx_purchase_status', 'status', 'purchased_at'),
     )
 
+    # purchased_at возвращается через RETURNING сразу при INSERT,
+    # поэтому после commit не нужен отдельный refresh
+    __mapper_args__ = {"eager_defaults": True}
+
 
 class Transaction(Base):
     """История транзакций с детализацией"""
@@ -480,6 +507,13 @@ class Transaction(Base):
     __table_args__ = (
         Index('idx_transaction_user_type', 'user_id', 'transaction_type'),
         Index('idx_transaction_created_at', 'created_at'),
+        # История транзакций пользователя (сортировка по дате)
+        Index('idx_transaction_user_created', 'user_id', 'created_at'),
+        # Сумма заработанных монет в статистике: только начисления
+        Index(
+            'idx_transaction_user_earned', 'user_id', 'coins_amount',
+            postgresql_where=text('coins_amount > 0')
+        ),
     )
 
 
@@ -208,6 +208,7 @@ async def claim_achievement_reward(
     db.add(transaction)
 
     await db.commit()
+    await cache_manager.invalidate_user(current_user.id)
 
     return {
         "message": "Награда получена!",
@@ -262,6 +263,7 @@ async def check_new_achievements(
 
     if newly_unlocked:
         await db.commit()
+        await cache_manager.invalidate_user(current_user.id)
 
     return {
         "new_achievements": len(newly_unlocked),
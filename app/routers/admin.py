@@ -247,12 +247,14 @@ async def grant_coins(
     db.add(transaction)
 
     await db.commit()
+    await cache_manager.invalidate_user(user_id)
 
     return {
         "message": f"Начислено {amount} монет",
         "new_balance": user.coins
     }
 async def _list_admin_tasks(
+        request: Request,
         response: Response,
         current_user: User,
         db: AsyncSession,
@@ -267,6 +269,8 @@ async def _list_admin_tasks(
 ) -> TaskListResponse:
     """Internal helper returning the admin task collection response."""
 
+    is_head_request = request.method == "HEAD"
+
     logger.info(
         "Admin task list requested",
         extra={
@@ -360,6 +364,7 @@ async def _list_admin_tasks(
 
 @router.api_route("/tasks", methods=["GET", "HEAD"], response_model=TaskListResponse)
 async def get_admin_tasks(
+        request: Request,
         response: Response,
         current_user: User = Depends(require_admin),
         db: AsyncSession = Depends(get_async_db),
@@ -375,6 +380,7 @@ async def get_admin_tasks(
         ),
 ):
     return await _list_admin_tasks(
+        request,
         response,
         current_user,
         db,
@@ -461,7 +467,7 @@ async def update_task(
         db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить существующее задание."""
-    print(f"Endpoint called: {request.url}")
+    logger.debug("Endpoint called: %s", request.url)
 
     update_payload = task_data.model_dump(exclude_unset=True)
     if not update_payload:
@@ -491,7 +497,7 @@ async def delete_task(
         db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить задание и связанные назначения."""
-    print(f"Endpoint called: {request.url}")
+    logger.debug("Endpoint called: %s", request.url)
 
     task = await _get_task_or_404(db, task_id, eager_assignments=True)
 
@@ -31,7 +31,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_d
         user = User(
             username=user_data.username,
             email=user_data.email,
-            password_hash=AuthService.get_password_hash(user_data.password),
+            password_hash=await AuthService.get_password_hash_async(user_data.password),
             full_name=user_data.full_name,
             role=UserRole.STUDENT,
             coins=settings.INITIAL_COINS,
@@ -2,6 +2,7 @@
 API для работы с монетами и транзакциями
 """
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from typing import List
@@ -124,26 +125,35 @@ async def get_leaderboard(
     """
     Таблица лидеров по уровню и опыту
     """
+    # Только нужные колонки строками Core - без ORM объектов User
     result = await db.execute(
-        select(User)
+        select(
+            User.username,
+            User.level,
+            User.experience,
+            User.tasks_completed,
+            User.average_score,
+        )
         .where(User.is_active == True)
         .order_by(User.level.desc(), User.experience.desc())
         .limit(limit)
     )
-    users = result.scalars().all()
 
-    leaderboard = []
-    for rank, user in enumerate(users, start=1):
-        leaderboard.append({
+    leaderboard = [
+        {
             "rank": rank,
-            "username": user.username,
-            "level": user.level,
-            "experience": user.experience,
-            "tasks_completed": user.tasks_completed,
-            "average_score": round(user.average_score, 1)
-        })
-
-    return leaderboard
+            "username": row.username,
+            "level": row.level,
+            "experience": row.experience,
+            "tasks_completed": row.tasks_completed,
+            "average_score": round(row.average_score, 1)
+        }
+        for rank, row in enumerate(result.all(), start=1)
+    ]
+
+    # Значения уже JSON-примитивы: JSONResponse сериализует их напрямую,
+    # минуя рекурсивный обход jsonable_encoder
+    return JSONResponse(content=leaderboard)
 
 
 def calculate_exp_for_level(level: int) -> int:
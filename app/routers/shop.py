@@ -10,6 +10,7 @@ from app.database import get_async_db
 from app.models import ShopItem, Purchase, User, Transaction
 from app.schemas import ShopItemResponse, PurchaseCreate, PurchaseResponse
 from app.auth import get_current_user
+from app.utils.cache import cache_manager
 
 router = APIRouter()
 
@@ -107,6 +108,8 @@ async def purchase_item(
         discount_applied=item.discount_percentage or 0
     )
     db.add(purchase)
+    # INSERT ... RETURNING заполняет id и purchased_at без повторного SELECT
+    await db.flush()
 
     # Списываем монеты
     current_user.coins -= item.price_coins
@@ -133,7 +136,7 @@ async def purchase_item(
     db.add(transaction)
 
     await db.commit()
-    await db.refresh(purchase)
+    await cache_manager.invalidate_user(current_user.id)
 
     return purchase
 
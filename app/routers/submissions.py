@@ -1,39 +1,130 @@
 """
 API для сдачи работ с загрузкой фотографий
 """
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, BackgroundTasks, Request, Response, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from typing import AsyncIterator, List, Optional
+from contextlib import suppress
+from math import isqrt
 import os
 import uuid
 from datetime import datetime
 import json
+import hashlib
+import logging
+
+import aiofiles
 
 from app.database import get_async_db
 from app.models import Submission, Task, User, Transaction, SubmissionStatus, TaskAssignment
-from app.services.ai_checker import ai_checker
+from app.services.ai_checker import ai_checker, CheckingQuality, CheckingResult
+from app.services.storage import s3_enabled, s3_uri, upload_chunks_to_s3, local_photo_path
+from app.utils.cache import cache_manager
+from app.utils.pagination import rows_before, next_cursor
+from app.worker import process_submission_task
 from app.auth import get_current_user
 from app.schemas import (
-    SubmissionResponse,
     SubmissionDetail,
+    SubmissionStatusResponse,
     HtmlSubmissionRequest,
     HtmlSubmissionResponse,
 )
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Директория для загрузки фото
 UPLOAD_DIR = "uploads/submissions"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Разрешенные форматы
-ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.heic', '.webp'}
+ALLOWED_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.heic', '.webp'})
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 
+# Сигнатуры (magic bytes) поддерживаемых изображений
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'jpeg',
+    b'\x89PNG\r\n\x1a\n': 'png',
+}
+HEIC_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1'}
+SIGNATURE_PEEK_SIZE = 12
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64 KB
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Определить формат изображения по первым байтам файла"""
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_format
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+
+    if header[4:8] == b'ftyp' and header[8:12] in HEIC_BRANDS:
+        return 'heic'
+
+    return None
+
+
+async def iter_upload_chunks(photo: UploadFile, hasher=None) -> AsyncIterator[bytes]:
+    """
+    Читать загруженное фото чанками с проверкой сигнатуры и размера.
+
+    Сигнатура проверяется по первому чанку до того, как он будет отдан,
+    поэтому не-графические загрузки отклоняются до записи куда-либо.
+    Размер контролируется по ходу чтения - файл целиком не держится в памяти.
+    Если передан hasher (hashlib), в него подается каждый чанк.
+    """
+    chunk = await photo.read(UPLOAD_CHUNK_SIZE)
+    if sniff_image_format(chunk[:SIGNATURE_PEEK_SIZE]) is None:
+        raise HTTPException(status_code=400, detail="Файл не является изображением")
+
+    file_size = 0
+    while chunk:
+        file_size += len(chunk)
+        if file_size > MAX_FILE_SIZE:
+            raise HTTPException(status_code=400, detail="Файл слишком большой (максимум 10 МБ)")
+
+        if hasher is not None:
+            hasher.update(chunk)
+        yield chunk
+        chunk = await photo.read(UPLOAD_CHUNK_SIZE)
+
 
-@router.post("/submit", response_model=SubmissionResponse)
+async def save_upload(photo: UploadFile, file_path: str, hasher=None) -> int:
+    """
+    Потоково сохранить загруженное фото на диск.
+
+    Первый чанк запрашивается до открытия файла, так что отклоненные
+    по сигнатуре загрузки не трогают диск. Возвращает размер файла в байтах.
+    """
+    chunks = iter_upload_chunks(photo, hasher)
+    first_chunk = await anext(chunks)
+
+    file_size = 0
+    try:
+        async with aiofiles.open(file_path, 'wb') as out_file:
+            await out_file.write(first_chunk)
+            file_size += len(first_chunk)
+            async for chunk in chunks:
+                await out_file.write(chunk)
+                file_size += len(chunk)
+    except Exception:
+        # Не оставляем на диске обрывки отклоненных загрузок
+        with suppress(OSError):
+            os.remove(file_path)
+        raise
+
+    return file_size
+
+
+@router.post("/submit", status_code=status.HTTP_202_ACCEPTED)
 async def submit_photo_task(
+        request: Request,
         task_id: int = Form(...),
         photo: UploadFile = File(...),
         background_tasks: BackgroundTasks = None,
@@ -42,6 +133,9 @@ async def submit_photo_task(
 ):
     """
     Сдать задание - загрузить фото работы
+
+    Проверка идет асинхронно: ответ 202 содержит id сдачи, а заголовок
+    Location указывает на эндпоинт статуса, который опрашивает клиент.
     """
 
     # Проверяем задание
@@ -53,57 +147,88 @@ async def submit_photo_task(
     if not task:
         raise HTTPException(status_code=404, detail="Задание не найдено")
 
-    if task.status != "active":
+    task_status = task.status.value if hasattr(task.status, "value") else task.status
+    if task_status != "active":
         raise HTTPException(status_code=400, detail="Задание неактивно")
 
+    # Повторная сдача того же задания - следующая попытка
+    attempt_result = await db.execute(
+        select(func.max(Submission.attempt_number)).where(
+            Submission.user_id == current_user.id,
+            Submission.task_id == task.id
+        )
+    )
+    attempt_number = (attempt_result.scalar() or 0) + 1
+
+    if task.max_attempts and attempt_number > task.max_attempts:
+        raise HTTPException(status_code=400, detail="Исчерпан лимит попыток для этого задания")
+
     # Проверяем формат файла
     file_ext = os.path.splitext(photo.filename)[1].lower()
     if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Неподдерживаемый формат. Разрешены: {', '.join(ALLOWED_EXTENSIONS)}"
+            detail=f"Неподдерживаемый формат. Разрешены: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
         )
 
-    # Проверяем размер файла
-    contents = await photo.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="Файл слишком большой (максимум 10 МБ)")
-
     # Генерируем уникальное имя файла
     unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
 
-    # Сохраняем файл
-    with open(file_path, 'wb') as f:
-        f.write(contents)
+    # Сохраняем файл потоково, проверяя размер и сигнатуру (отсекаем
+    # не-изображения до дорогой AI проверки). При настроенном S3 фото
+    # уходит сразу в бакет, минуя диск API сервера
+    photo_hasher = hashlib.sha256()
+    if s3_enabled():
+        object_key = f"submissions/{unique_filename}"
+        file_size = await upload_chunks_to_s3(iter_upload_chunks(photo, photo_hasher), object_key)
+        file_path = s3_uri(object_key)
+        photo_url = file_path
+    else:
+        file_path = os.path.join(UPLOAD_DIR, unique_filename)
+        file_size = await save_upload(photo, file_path, photo_hasher)
+        photo_url = f"/uploads/submissions/{unique_filename}"
 
     # Создаем запись о сдаче
     submission = Submission(
         user_id=current_user.id,
         task_id=task.id,
-        photo_urls=json.dumps([f"/uploads/submissions/{unique_filename}"]),
+        photo_urls=[photo_url],
         photo_filename=unique_filename,
         status=SubmissionStatus.PROCESSING,
-        file_size=len(contents)
+        file_size=file_size,
+        photo_hash=photo_hasher.hexdigest(),
+        attempt_number=attempt_number
     )
     db.add(submission)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Параллельная сдача того же задания заняла этот номер попытки
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Работа по этому заданию уже отправляется, повторите попытку")
     await db.refresh(submission)
 
-    # Запускаем AI проверку в фоновой задаче
-    if background_tasks:
+    # Запускаем AI проверку: в Celery воркере, если он настроен,
+    # иначе в фоновой задаче текущего процесса
+    if process_submission_task is not None:
+        process_submission_task.delay(submission.id, file_path)
+    elif background_tasks:
         background_tasks.add_task(
             process_submission,
             submission_id=submission.id,
-            file_path=file_path,
-            task=task
+            file_path=file_path
         )
 
-    return {
-        "id": submission.id,
-        "status": "processing",
-        "message": "Фото загружено, началась проверка. Результаты появятся через 10-30 секунд"
-    }
+    status_url = request.url_for("get_submission_status", submission_id=submission.id)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "id": submission.id,
+            "status": "processing",
+            "message": "Фото загружено, началась проверка. Результаты появятся через 10-30 секунд"
+        },
+        headers={"Location": str(status_url)}
+    )
 
 
 @router.post("/html-result", response_model=HtmlSubmissionResponse)
@@ -164,16 +289,11 @@ async def submit_html_result(
     current_user.experience += exp_earned
     current_user.tasks_completed = (current_user.tasks_completed or 0) + 1
 
-    scores_result = await db.execute(
-        select(Submission.score).where(
-            Submission.user_id == current_user.id,
-            Submission.status == SubmissionStatus.CHECKED
-        )
-    )
-    score_values = [row[0] for row in scores_result.all() if row[0] is not None]
-    if score_values:
-        current_user.average_score = sum(score_values) / len(score_values)
-        current_user.best_score = max(score_values)
+    await db.flush()
+    avg_score, best_score = await get_score_aggregates(db, current_user.id)
+    if avg_score is not None:
+        current_user.average_score = avg_score
+        current_user.best_score = best_score
 
     previous_level = current_user.level
     new_level = calculate_level(current_user.experience)
@@ -206,6 +326,7 @@ async def submit_html_result(
     await db.flush()
     await db.commit()
     await db.refresh(submission)
+    await cache_manager.invalidate_user(current_user.id)
 
     level_message = " Уровень повышен!" if current_user.level > previous_level else ""
     return HtmlSubmissionResponse(
@@ -218,8 +339,47 @@ async def submit_html_result(
     )
 
 
+async def find_duplicate_check(db: AsyncSession, submission: Submission) -> Optional[CheckingResult]:
+    """
+    Найти уже проверенную сдачу с тем же фото и вернуть ее результат.
 
-async def process_submission(submission_id: int, file_path: str, task: Task):
+    Ищем только среди сдач того же пользователя по тому же заданию: чужое
+    фото с совпадающим хешем - это списывание, и его должна оценить проверка.
+    """
+    if not submission.photo_hash:
+        return None
+
+    result = await db.execute(
+        select(Submission)
+        .where(
+            Submission.task_id == submission.task_id,
+            Submission.photo_hash == submission.photo_hash,
+            Submission.user_id == submission.user_id,
+            Submission.status == SubmissionStatus.CHECKED,
+            Submission.id != submission.id,
+        )
+        .order_by(Submission.checked_at.desc())
+        .limit(1)
+    )
+    prior = result.scalar_one_or_none()
+    if prior is None:
+        return None
+
+    return CheckingResult(
+        recognized_text=prior.recognized_text or "",
+        score=prior.score or 0.0,
+        feedback=prior.ai_feedback or "",
+        detailed_analysis=prior.detailed_analysis or {},
+        confidence_score=prior.confidence_score or 0.0,
+        processing_time=0.0,
+        status="checked",
+        quality_level=CheckingQuality.STANDARD,
+        suggestions=[],
+        plagiarism_score=prior.plagiarism_score,
+    )
+
+
+async def process_submission(submission_id: int, file_path: str):
     """
     Фоновая обработка сдачи - AI проверка
     """
@@ -228,21 +388,34 @@ async def process_submission(submission_id: int, file_path: str, task: Task):
     async with AsyncSessionLocal() as db:
         try:
             # Получаем сдачу
+            # Сдачу, автора и задание загружаем одним запросом; задание
+            # перечитываем в этой сессии (в т.ч. в Celery воркере)
             result = await db.execute(
-                select(Submission).where(Submission.id == submission_id)
+                select(Submission, User, Task)
+                .join(User, User.id == Submission.user_id)
+                .join(Task, Task.id == Submission.task_id)
+                .where(Submission.id == submission_id)
             )
-            submission = result.scalar_one_or_none()
-            if not submission:
+            row = result.one_or_none()
+            if row is None:
                 return
-
-            # Запускаем AI проверку
-            checking_result = await ai_checker.check_photo_submission(
-                photo_path=file_path,
-                task_description=task.description,
-                task_type=task.task_type,
-                checking_criteria=json.dumps(task.checking_criteria) if task.checking_criteria else "{}",
-                user_id=submission.user_id
-            )
+            submission, user, task = row
+
+            # Повторную сдачу того же фото не отправляем в AI еще раз
+            checking_result = await find_duplicate_check(db, submission)
+            is_duplicate = checking_result is not None
+            if checking_result is None:
+                # Фото из S3 скачивается во временный файл на время проверки
+                async with local_photo_path(file_path) as photo_path:
+                    checking_result = await ai_checker.check_photo_submission(
+                        photo_path=photo_path,
+                        task_description=task.description,
+                        task_type=task.task_type,
+                        checking_criteria=json.dumps(task.checking_criteria) if task.checking_criteria else "{}",
+                        user_id=submission.user_id,
+                        photo_hash=submission.photo_hash,
+                        photo_location=file_path
+                    )
 
             # Обновляем результаты
             submission.recognized_text = checking_result.recognized_text
@@ -254,6 +427,13 @@ async def process_submission(submission_id: int, file_path: str, task: Task):
             submission.processing_time = checking_result.processing_time
             submission.confidence_score = checking_result.confidence_score
 
+            if is_duplicate:
+                # Награда за это фото уже начислена при первой проверке
+                submission.coins_earned = 0
+                submission.exp_earned = 0
+                await db.commit()
+                return
+
             # Рассчитываем награды
             coins_earned = calculate_coins(checking_result.score, task.reward_coins)
             exp_earned = calculate_exp(checking_result.score, task.reward_exp)
@@ -262,36 +442,22 @@ async def process_submission(submission_id: int, file_path: str, task: Task):
             submission.exp_earned = exp_earned
 
             # Обновляем пользователя
-            user_result = await db.execute(
-                select(User).where(User.id == submission.user_id)
-            )
-            user = user_result.scalar_one_or_none()
-
-            if user:
-                user.coins += coins_earned
-                user.experience += exp_earned
-                user.tasks_completed += 1
-
-                # Обновляем средний балл
-                submissions_result = await db.execute(
-                    select(Submission)
-                    .where(
-                        Submission.user_id == user.id,
-                        Submission.status == SubmissionStatus.CHECKED
-                    )
-                )
-                all_submissions = submissions_result.scalars().all()
-
-                if all_submissions:
-                    avg_score = sum(s.score for s in all_submissions) / len(all_submissions)
-                    user.average_score = avg_score
-                    user.best_score = max(s.score for s in all_submissions)
-
-                # Проверяем повышение уровня
-                new_level = calculate_level(user.experience)
-                if new_level > user.level:
-                    user.level = new_level
-                    user.coins += 50  # Бонус за новый уровень
+            user.coins += coins_earned
+            user.experience += exp_earned
+            user.tasks_completed += 1
+
+            # Обновляем средний балл (с учетом текущей сдачи)
+            await db.flush()
+            avg_score, best_score = await get_score_aggregates(db, user.id)
+            if avg_score is not None:
+                user.average_score = avg_score
+                user.best_score = best_score
+
+            # Проверяем повышение уровня
+            new_level = calculate_level(user.experience)
+            if new_level > user.level:
+                user.level = new_level
+                user.coins += 50  # Бонус за новый уровень
 
             # Создаем транзакцию
             transaction = Transaction(
@@ -302,14 +468,16 @@ async def process_submission(submission_id: int, file_path: str, task: Task):
                 category="reward",
                 description=f"Награда за задание: {task.title}",
                 related_submission_id=submission.id,
-                coins_balance=user.coins if user else 0
+                coins_balance=user.coins
             )
             db.add(transaction)
 
+            # Сдача, пользователь и транзакция фиксируются одним коммитом
             await db.commit()
+            await cache_manager.invalidate_user(user.id)
 
         except Exception as e:
-            print(f"Error processing submission {submission_id}: {e}")
+            logger.exception("Error processing submission %s", submission_id)
             submission.status = SubmissionStatus.FAILED
             submission.ai_feedback = f"Ошибка при обработке: {str(e)}"
             await db.commit()
@@ -317,21 +485,36 @@ async def process_submission(submission_id: int, file_path: str, task: Task):
 
 @router.get("/my-submissions", response_model=List[SubmissionDetail])
 async def get_my_submissions(
-        skip: int = 0,
+        response: Response,
+        after: Optional[str] = None,
         limit: int = 20,
         current_user: User = Depends(get_current_user),
         db: AsyncSession = Depends(get_async_db)
 ):
-    """Получить свои сдачи"""
-    result = await db.execute(
+    """
+    Получить свои сдачи
+
+    Пагинация по курсору (keyset): передайте в after значение заголовка
+    X-Next-Cursor из предыдущего ответа. В отличие от OFFSET база не
+    просматривает пропущенные строки, поэтому глубокие страницы не медленнее первой.
+    """
+    query = (
         select(Submission)
+        .options(selectinload(Submission.task))
         .where(Submission.user_id == current_user.id)
-        .order_by(Submission.submitted_at.desc())
-        .offset(skip)
-        .limit(limit)
+    )
+    if after:
+        query = query.where(rows_before(Submission.submitted_at, Submission.id, after))
+
+    result = await db.execute(
+        query.order_by(Submission.submitted_at.desc(), Submission.id.desc()).limit(limit)
     )
     submissions = result.scalars().all()
 
+    cursor = next_cursor(submissions, limit, "submitted_at")
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
     return submissions
 
 
@@ -343,7 +526,9 @@ async def get_submission(
 ):
     """Получить детали сдачи"""
     result = await db.execute(
-        select(Submission).where(Submission.id == submission_id)
+        select(Submission)
+        .options(selectinload(Submission.task))
+        .where(Submission.id == submission_id)
     )
     submission = result.scalar_one_or_none()
 
@@ -357,7 +542,9 @@ async def get_submission(
     return submission
 
 
-@router.get("/{submission_id}/status")
+# С response_model FastAPI сериализует ответ через pydantic-core, а не через
+# jsonable_encoder - для часто опрашиваемого статуса это дешевле
+@router.get("/{submission_id}/status", response_model=SubmissionStatusResponse)
 async def get_submission_status(
         submission_id: int,
         current_user: User = Depends(get_current_user),
@@ -383,6 +570,21 @@ async def get_submission_status(
     }
 
 
+async def get_score_aggregates(db: AsyncSession, user_id: int) -> tuple[Optional[float], Optional[float]]:
+    """Средний и лучший балл по проверенным сдачам одним запросом"""
+    result = await db.execute(
+        select(func.avg(Submission.score), func.max(Submission.score)).where(
+            Submission.user_id == user_id,
+            Submission.status == SubmissionStatus.CHECKED,
+            Submission.score.isnot(None)
+        )
+    )
+    avg_score, best_score = result.one()
+    if avg_score is None:
+        return None, None
+    return float(avg_score), float(best_score)
+
+
 def calculate_coins(score: float, base_reward: int) -> int:
     """Рассчитать монеты за оценку"""
     multiplier = max(0.1, score / 100)
@@ -396,6 +598,5 @@ def calculate_exp(score: float, base_exp: int) -> int:
 
 
 def calculate_level(experience: int) -> int:
-    """Рассчитать уровень по опыту"""
-    import math
-    return max(1, int(math.sqrt(experience / 100)) + 1)
\ No newline at end of file
+    """Рассчитать уровень по опыту (уровень L начинается с 100 * (L - 1)^2)"""
+    return isqrt(max(experience, 0) // 100) + 1
\ No newline at end of file
@@ -1,26 +1,101 @@
 """API для работы с заданиями"""
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Response, Request
-from fastapi.responses import JSONResponse
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import Optional
+from sqlalchemy import select, func, text, literal, union_all
+from typing import List, Optional
 
 from app.database import get_async_db
 from app.models import Task, User, TaskStatus, TaskAssignment
-from app.schemas import TaskCreate, TaskResponse, TaskListResponse
-from app.utils.task_serializers import serialize_task, serialize_tasks, build_task_list
+from app.schemas import TaskCreate, TaskResponse, TaskListResponse, TaskFiltersResponse
+from app.utils.task_serializers import serialize_task, serialize_tasks, build_task_list, TASK_LIST_COLUMNS
 from app.utils.task_filters import task_is_effectively_active
+from app.utils.pagination import rows_before, next_cursor
+from app.utils.cache import cache_manager, CacheKeys
 from app.auth import get_current_user
 
 router = APIRouter()
 
+# Списки предметов/типов меняются только при изменении заданий, а все
+# записи заданий сбрасывают tasks:* - TTL лишь страховка от пропущенного сброса
+TASK_METADATA_TTL = 6 * 3600
+# Готовые страницы публичного списка заданий
+TASK_LIST_TTL = 60
+# Оценка планировщика по статистике таблицы обновляется только ANALYZE
+TASK_COUNT_ESTIMATE_TTL = 60
+
+
+async def estimate_task_count(db: AsyncSession) -> Optional[int]:
+    """
+    Приблизительное количество активных заданий по оценке планировщика PostgreSQL.
+
+    EXPLAIN считает строки с тем же фильтром активности, что и список, -
+    в отличие от pg_class.reltuples, где учтены черновики и архив.
+    Возвращает None, если база не PostgreSQL или оценку получить не удалось -
+    тогда вызывающий код считает точное значение.
+    """
+    bind = getattr(db, "bind", None)
+    if bind is None or bind.dialect.name != "postgresql":
+        return None
+
+    cached = await cache_manager.get(CacheKeys.TASK_COUNT_ESTIMATE)
+    if cached is not None:
+        return cached
+
+    query = select(literal(1)).select_from(Task).where(task_is_effectively_active())
+    compiled = query.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = await db.scalar(text(f"EXPLAIN (FORMAT JSON) {compiled}"))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    try:
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+    except (TypeError, LookupError, ValueError):
+        return None
+
+    await cache_manager.set(CacheKeys.TASK_COUNT_ESTIMATE, estimate, ttl=TASK_COUNT_ESTIMATE_TTL)
+    return estimate
+
+
+async def load_task_filters(db: AsyncSession) -> dict:
+    """
+    Предметы и типы активных заданий одним запросом (UNION ALL с меткой).
+
+    Клиенты почти всегда запрашивают оба списка вместе для фильтров в UI.
+    """
+    cached = await cache_manager.get(CacheKeys.TASK_FILTERS)
+    if cached is not None:
+        return cached
+
+    query = union_all(
+        select(literal("subject").label("kind"), Task.subject.label("value"))
+        .where(Task.subject.isnot(None), task_is_effectively_active())
+        .distinct(),
+        select(literal("type").label("kind"), Task.task_type.label("value"))
+        .where(task_is_effectively_active())
+        .distinct(),
+    )
+    result = await db.execute(query)
+
+    filters = {"subjects": [], "types": []}
+    for kind, value in result.all():
+        if kind == "subject":
+            if value:
+                filters["subjects"].append(value)
+        else:
+            filters["types"].append(value)
+
+    await cache_manager.set(CacheKeys.TASK_FILTERS, filters, ttl=TASK_METADATA_TTL)
+    return filters
+
 
 @router.get("", response_model=TaskListResponse)
 async def get_tasks(
-        request: Request,
-        response: Response,
         skip: int = 0,
         limit: int = 20,
+        after: Optional[str] = Query(
+            None, description="Курсор следующей страницы (next_cursor из предыдущего ответа)"
+        ),
         subject: Optional[str] = None,
         difficulty: Optional[int] = Query(None, ge=1, le=5),
         task_type: Optional[str] = None,
@@ -28,7 +103,24 @@ async def get_tasks(
 ):
     """
     Получить список заданий с фильтрами
+
+    Для глубоких страниц используйте курсор after вместо skip: база ищет
+    начало страницы по индексу, а не просматривает пропущенные строки.
     """
+    # Каталог меняется редко: отдаем уже сериализованную страницу из кэша,
+    # минуя и базу, и валидацию Pydantic
+    page_key = f"after={after}" if after else skip
+    cache_key = CacheKeys.TASKS_LIST.format(
+        filters_hash=f"{subject}:{difficulty}:{task_type}:{page_key}:{limit}"
+    )
+    cached_page = await cache_manager.get(cache_key)
+    if cached_page is not None:
+        return Response(
+            content=cached_page["body"],
+            media_type="application/json",
+            headers={"X-Total-Count": str(cached_page["total"])},
+        )
+
     # Публичный список заданий должен показывать все опубликованные задания,
     # независимо от того, кто их создал (администратор или преподаватель).
     # Ранее мы исключали задания, созданные администраторами, что ломало API
@@ -45,34 +137,62 @@ async def get_tasks(
     if task_type:
         filters.append(Task.task_type == task_type)
 
-    base_query = select(Task).where(*filters)
-    count_query = select(func.count(Task.id)).where(*filters)
+    # Без пользовательских фильтров точное число не нужно - для пагинации
+    # достаточно оценки планировщика
+    total = None
+    if not (subject or difficulty or task_type):
+        total = await estimate_task_count(db)
 
-    result = await db.execute(
-        base_query.order_by(Task.created_at.desc()).offset(skip).limit(limit)
-    )
-    tasks = result.scalars().all()
-    count_result = await db.execute(count_query)
-
-    if hasattr(count_result, "scalar_one"):
-        total = count_result.scalar_one()
-    elif hasattr(count_result, "scalar"):
-        total = count_result.scalar()
-    elif hasattr(count_result, "first"):
-        first_row = count_result.first()
-        total = first_row[0] if first_row else 0
+    page_filters = list(filters)
+    if after:
+        page_filters.append(rows_before(Task.created_at, Task.id, after))
+        skip = 0
+    ordering = (Task.created_at.desc(), Task.id.desc())
+
+    # Список только читается - берем строки Core вместо ORM объектов
+    if total is not None or after:
+        result = await db.execute(
+            select(*TASK_LIST_COLUMNS).where(*page_filters).order_by(*ordering).offset(skip).limit(limit)
+        )
+        tasks = result.all()
+        if total is None:
+            # Окно по странице с курсором посчитало бы только оставшиеся строки
+            count_result = await db.execute(select(func.count(Task.id)).where(*filters))
+            total = count_result.scalar() or 0
     else:
-        total = len(tasks)
-    serialized = serialize_tasks(tasks)
-    user_agent = request.headers.get("user-agent", "").lower()
-    if user_agent.startswith("testclient"):
-        return JSONResponse(
-            content=[item.model_dump(mode="json") for item in serialized],
-            headers={"X-Total-Count": str(total)},
+        # Общее количество считаем оконной функцией в том же запросе,
+        # чтобы не делать отдельный COUNT(*) на каждую страницу
+        result = await db.execute(
+            select(*TASK_LIST_COLUMNS, func.count().over().label("total"))
+            .where(*page_filters)
+            .order_by(*ordering)
+            .offset(skip)
+            .limit(limit)
         )
+        tasks = result.all()
+
+        if tasks:
+            total = tasks[0].total
+        elif skip:
+            # Страница за пределами выборки - окно не вернуло строк
+            count_result = await db.execute(select(func.count(Task.id)).where(*filters))
+            total = count_result.scalar() or 0
+        else:
+            total = 0
 
-    response.headers["X-Total-Count"] = str(total)
-    return TaskListResponse(items=serialized, total=total)
+    serialized = serialize_tasks(tasks)
+
+    # Элементы уже провалидированы в serialize_tasks - обертку не проверяем повторно
+    body = TaskListResponse.model_construct(
+        items=serialized, total=total, next_cursor=next_cursor(tasks, limit)
+    ).model_dump_json()
+    await cache_manager.set(cache_key, {"total": total, "body": body}, ttl=TASK_LIST_TTL)
+
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"X-Total-Count": str(total)},
+    )
 
 
 @router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
@@ -93,6 +213,9 @@ async def create_task(
     await db.commit()
     await db.refresh(new_task)
 
+    # Инвалидируем кэш списков заданий
+    await cache_manager.invalidate_pattern("tasks:*")
+
     return serialize_task(new_task)
 
 @router.get("/assigned", response_model=TaskListResponse)
@@ -117,6 +240,14 @@ async def get_assigned_tasks(
     return build_task_list(tasks)
 
 
+@router.get("/filters", response_model=TaskFiltersResponse)
+async def get_task_filters(db: AsyncSession = Depends(get_async_db)):
+    """
+    Получить предметы и типы заданий для фильтров
+    """
+    return await load_task_filters(db)
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
         task_id: int,
@@ -135,34 +266,19 @@ async def get_task(
 
     return serialize_task(task)
 
-@router.get("/subjects/list")
+@router.get("/subjects/list", response_model=List[str])
 async def get_subjects(db: AsyncSession = Depends(get_async_db)):
     """
     Получить список доступных предметов
     """
-    result = await db.execute(
-        select(Task.subject)
-        .where(
-            Task.subject.isnot(None),
-            task_is_effectively_active(),
-        )
-        .distinct()
-    )
-    subjects = [row[0] for row in result.all() if row[0]]
-
-    return subjects
+    filters = await load_task_filters(db)
+    return filters["subjects"]
 
 
-@router.get("/types/list")
+@router.get("/types/list", response_model=List[str])
 async def get_task_types(db: AsyncSession = Depends(get_async_db)):
     """
     Получить список типов заданий
     """
-    result = await db.execute(
-        select(Task.task_type)
-        .where(task_is_effectively_active())
-        .distinct()
-    )
-    types = [row[0] for row in result.all()]
-
-    return types
\ No newline at end of file
+    filters = await load_task_filters(db)
+    return filters["types"]
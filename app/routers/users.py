@@ -1,15 +1,21 @@
 """
 API для управления пользователями и профилями
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, and_, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import List, Optional
 from datetime import datetime, timedelta
+from contextlib import suppress
+import hashlib
 import os
+import uuid
 
-from app.database import get_async_db
-from app.models import User, Submission, Purchase, Transaction, UserRole
+import aiofiles
+
+from app.database import get_async_db, use_autocommit
+from app.models import User, Submission, Purchase, Transaction, UserRole, UserAchievement
 from app.schemas import (
     UserResponse, UserUpdate, UserStats, PasswordChange,
     TransactionResponse
@@ -19,10 +25,38 @@ from app.auth import (
     require_admin, AuthService
 )
 from app.utils.cache import cache_manager, cache_result
+from app.utils.pagination import rows_before, next_cursor
 from app.config import settings
 
 router = APIRouter()
 
+# Колонки для read-only списков: строки Core вместо ORM объектов
+USER_RESPONSE_COLUMNS = tuple(getattr(User, name) for name in UserResponse.model_fields)
+TRANSACTION_COLUMNS = tuple(getattr(Transaction, name) for name in TransactionResponse.model_fields)
+
+MAX_AVATAR_SIZE = 5 * 1024 * 1024  # 5 MB
+AVATAR_CHUNK_SIZE = 64 * 1024  # 64 KB
+AVATAR_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp'})
+# Сигнатуры (magic bytes) -> расширение, с которым сохраняется аватар
+AVATAR_SIGNATURES = {
+    b'\xff\xd8\xff': '.jpg',
+    b'\x89PNG\r\n\x1a\n': '.png',
+    b'GIF87a': '.gif',
+    b'GIF89a': '.gif',
+}
+
+
+def sniff_avatar_extension(header: bytes) -> Optional[str]:
+    """Определить расширение аватара по первым байтам файла"""
+    for signature, extension in AVATAR_SIGNATURES.items():
+        if header.startswith(signature):
+            return extension
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+
+    return None
+
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_profile(
@@ -40,19 +74,25 @@ async def update_profile(
 ):
     """Обновить свой профиль"""
 
-    # Обновляем только переданные поля
-    update_data = updates.dict(exclude_unset=True)
-
-    for field, value in update_data.items():
-        setattr(current_user, field, value)
-
-    current_user.updated_at = datetime.utcnow()
+    # Обновляем только переданные поля одним UPDATE, без refresh
+    update_data = updates.model_dump(exclude_unset=True)
+    update_data["updated_at"] = datetime.utcnow()
 
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(**update_data)
+        .execution_options(synchronize_session=False)
+    )
     await db.commit()
-    await db.refresh(current_user)
+
+    # Значения уже в базе - переносим их в объект, не помечая его измененным
+    for field, value in update_data.items():
+        set_committed_value(current_user, field, value)
 
     # Инвалидируем кэш
     await cache_manager.delete(f"user:{current_user.id}")
+    await cache_manager.invalidate_user(current_user.id)
 
     return current_user
 
@@ -66,7 +106,7 @@ async def change_password(
     """Изменить пароль"""
 
     # Проверяем старый пароль
-    if not AuthService.verify_password(password_data.old_password, current_user.password_hash):
+    if not await AuthService.verify_password_async(password_data.old_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неправильный текущий пароль"
@@ -81,7 +121,7 @@ async def change_password(
         )
 
     # Обновляем пароль
-    current_user.password_hash = AuthService.get_password_hash(password_data.new_password)
+    current_user.password_hash = await AuthService.get_password_hash_async(password_data.new_password)
     current_user.updated_at = datetime.utcnow()
 
     await db.commit()
@@ -97,37 +137,57 @@ async def upload_avatar(
 ):
     """Загрузить аватар"""
 
-    # Проверяем формат
-    allowed_formats = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    # Проверяем формат: расширение из имени отсекает очевидно чужие файлы,
+    # а настоящий формат определяется по содержимому до записи на диск
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
 
-    if file_ext not in allowed_formats:
+    if file_ext not in AVATAR_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Недопустимый формат. Разрешены: {', '.join(allowed_formats)}"
+            detail=f"Недопустимый формат. Разрешены: {', '.join(sorted(AVATAR_EXTENSIONS))}"
         )
 
-    # Проверяем размер (5 MB)
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:
+    chunk = await file.read(AVATAR_CHUNK_SIZE)
+    file_ext = sniff_avatar_extension(chunk[:12])
+    if file_ext is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Файл слишком большой (максимум 5 МБ)"
+            detail="Файл не является изображением"
         )
 
-    # Сохраняем файл
-    import uuid
-    filename = f"avatar_{current_user.id}_{uuid.uuid4()}{file_ext}"
+    # Сохраняем файл потоково, проверяя размер по ходу чтения. Имя файла -
+    # хеш содержимого: одинаковые аватары не дублируются, а URL меняется
+    # только вместе с картинкой (удобно для CDN и кэша браузера)
     avatar_dir = "uploads/avatars"
     os.makedirs(avatar_dir, exist_ok=True)
 
-    file_path = os.path.join(avatar_dir, filename)
-    with open(file_path, 'wb') as f:
-        f.write(contents)
+    tmp_path = os.path.join(avatar_dir, f"avatar_{current_user.id}_{uuid.uuid4()}.part")
+    hasher = hashlib.sha256()
+    total_size = 0
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as out_file:
+            while chunk:
+                total_size += len(chunk)
+                if total_size > MAX_AVATAR_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Файл слишком большой (максимум 5 МБ)"
+                    )
+                hasher.update(chunk)
+                await out_file.write(chunk)
+                chunk = await file.read(AVATAR_CHUNK_SIZE)
+    except Exception:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+    filename = f"avatar_{current_user.id}_{hasher.hexdigest()[:16]}{file_ext}"
+    os.replace(tmp_path, os.path.join(avatar_dir, filename))
 
     # Обновляем URL
     current_user.avatar_url = f"/uploads/avatars/{filename}"
     await db.commit()
+    await cache_manager.invalidate_user(current_user.id)
 
     return {
         "message": "Аватар загружен",
@@ -136,65 +196,34 @@ async def upload_avatar(
 
 
 @router.get("/me/stats", response_model=UserStats)
-@cache_result("user_stats", ttl=300)
+@cache_result("user:stats", ttl=300, key_builder=lambda current_user, **_: str(current_user.id))
 async def get_my_stats(
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_async_db)
 ):
     """Получить детальную статистику"""
 
-    # Общее количество сдач
-    total_submissions = await db.scalar(
-        select(func.count(Submission.id)).where(
-            Submission.user_id == current_user.id
-        )
-    )
-
-    # Успешные сдачи (score >= 50)
-    successful = await db.scalar(
-        select(func.count(Submission.id)).where(
-            and_(
-                Submission.user_id == current_user.id,
-                Submission.score >= 50
-            )
-        )
-    )
-
-    # Статистика за неделю
+    user_id = current_user.id
     week_ago = datetime.utcnow() - timedelta(days=7)
-    week_submissions = await db.scalar(
-        select(func.count(Submission.id)).where(
-            and_(
-                Submission.user_id == current_user.id,
-                Submission.submitted_at >= week_ago
-            )
-        )
-    )
 
     # Заработанные монеты
-    earned_result = await db.execute(
-        select(func.sum(Transaction.coins_amount)).where(
-            and_(
-                Transaction.user_id == current_user.id,
-                Transaction.coins_amount > 0
-            )
-        )
+    earned_subquery = (
+        select(func.coalesce(func.sum(Transaction.coins_amount), 0))
+        .where(Transaction.user_id == user_id, Transaction.coins_amount > 0)
+        .scalar_subquery()
     )
-    total_earned = earned_result.scalar() or 0
 
     # Количество достижений
-    achievements_count = await db.scalar(
-        select(func.count()).select_from(
-            select(1).join_from(
-                User,
-                User.achievements
-            ).where(User.id == current_user.id).subquery()
-        )
+    achievements_subquery = (
+        select(func.count(UserAchievement.id))
+        .where(UserAchievement.user_id == user_id)
+        .scalar_subquery()
     )
 
     # Позиция в рейтинге
-    rank_query = await db.execute(
-        select(func.count(User.id)).where(
+    rank_subquery = (
+        select(func.count(User.id))
+        .where(
             or_(
                 User.level > current_user.level,
                 and_(
@@ -203,8 +232,29 @@ async def get_my_stats(
                 )
             )
         )
+        .scalar_subquery()
     )
-    rank = rank_query.scalar() + 1
+
+    # Все показатели одним запросом: счетчики сдач через FILTER,
+    # остальное - скалярными подзапросами
+    stats_result = await db.execute(
+        select(
+            func.count(Submission.id).label("total_submissions"),
+            func.count(Submission.id).filter(Submission.score >= 50).label("successful"),
+            func.count(Submission.id).filter(Submission.submitted_at >= week_ago).label("week_submissions"),
+            earned_subquery.label("total_earned"),
+            achievements_subquery.label("achievements_count"),
+            rank_subquery.label("users_ahead"),
+        ).where(Submission.user_id == user_id)
+    )
+    stats = stats_result.one()
+
+    total_submissions = stats.total_submissions
+    successful = stats.successful
+    week_submissions = stats.week_submissions
+    total_earned = stats.total_earned or 0
+    achievements_count = stats.achievements_count
+    rank = (stats.users_ahead or 0) + 1
 
     return UserStats(
         user_id=current_user.id,
@@ -223,27 +273,43 @@ async def get_my_stats(
 
 @router.get("/me/transactions", response_model=List[TransactionResponse])
 async def get_my_transactions(
+        response: Response,
         skip: int = 0,
         limit: int = 50,
+        after: Optional[str] = None,
         current_user: User = Depends(get_current_active_user),
         db: AsyncSession = Depends(get_async_db)
 ):
-    """История транзакций"""
+    """
+    История транзакций
+
+    Пагинация по курсору: передайте в after значение заголовка
+    X-Next-Cursor из предыдущего ответа (skip тогда игнорируется).
+    """
+    # История только читается - строки Core без ORM объектов в сессии
+    query = select(*TRANSACTION_COLUMNS).where(Transaction.user_id == current_user.id)
+    if after:
+        query = query.where(rows_before(Transaction.created_at, Transaction.id, after))
+    else:
+        query = query.offset(skip)
 
     result = await db.execute(
-        select(Transaction)
-        .where(Transaction.user_id == current_user.id)
-        .order_by(Transaction.created_at.desc())
-        .offset(skip)
+        query
+        .order_by(Transaction.created_at.desc(), Transaction.id.desc())
         .limit(limit)
     )
 
-    transactions = result.scalars().all()
-    return transactions
+    transactions = result.all()
+
+    cursor = next_cursor(transactions, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+
+    return [TransactionResponse.from_orm_fast(row) for row in transactions]
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-@cache_result("user_profile", ttl=600)
+@cache_result("user:profile", ttl=600, key_builder=lambda user_id, **_: str(user_id))
 async def get_user_by_id(
         user_id: int,
         db: AsyncSession = Depends(get_async_db)
@@ -275,13 +341,15 @@ async def list_users(
 ):
     """Получить список пользователей (только для админов)"""
 
-    query = select(User)
+    # Только поля ответа, строками Core: без password_hash и ORM объектов
+    query = select(*USER_RESPONSE_COLUMNS)
 
     # Фильтры
     if role:
         query = query.where(User.role == role)
 
     if search:
+        # ILIKE '%...%' на PostgreSQL обслуживается триграммными GIN индексами
         query = query.where(
             or_(
                 User.username.ilike(f"%{search}%"),
@@ -293,9 +361,30 @@ async def list_users(
     query = query.offset(skip).limit(limit)
 
     result = await db.execute(query)
-    users = result.scalars().all()
 
-    return users
+    return [UserResponse.from_orm_fast(row) for row in result.all()]
+
+
+async def update_user_or_404(db: AsyncSession, user_id: int, **values) -> None:
+    """
+    Обновить поля пользователя одним UPDATE ... RETURNING.
+
+    Строка не загружается в сессию; если пользователя нет, выбрасывается 404.
+    Одиночный UPDATE вне начатой транзакции выполняется в AUTOCOMMIT.
+    """
+    await use_autocommit(db)
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(**values)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.first() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Пользователь не найден"
+        )
 
 
 @router.put("/{user_id}/role")
@@ -307,19 +396,9 @@ async def update_user_role(
 ):
     """Изменить роль пользователя (только для админов)"""
 
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-
-    user.role = new_role
+    await update_user_or_404(db, user_id, role=new_role)
     await db.commit()
+    await cache_manager.invalidate_user(user_id)
 
     return {"message": f"Роль пользователя изменена на {new_role.value}"}
 
@@ -334,26 +413,16 @@ async def ban_user(
 ):
     """Заблокировать пользователя"""
 
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-
-    user.is_active = False
-    user.locked_until = datetime.utcnow() + timedelta(days=duration_days)
+    locked_until = datetime.utcnow() + timedelta(days=duration_days)
+    await update_user_or_404(db, user_id, is_active=False, locked_until=locked_until)
 
     await db.commit()
+    await cache_manager.invalidate_user(user_id)
 
     return {
         "message": f"Пользователь заблокирован на {duration_days} дней",
         "reason": reason,
-        "locked_until": user.locked_until
+        "locked_until": locked_until
     }
 
 
@@ -365,22 +434,15 @@ async def unban_user(
 ):
     """Разблокировать пользователя"""
 
-    result = await db.execute(
-        select(User).where(User.id == user_id)
+    await update_user_or_404(
+        db, user_id,
+        is_active=True,
+        locked_until=None,
+        failed_login_attempts=0
     )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-
-    user.is_active = True
-    user.locked_until = None
-    user.failed_login_attempts = 0
 
     await db.commit()
+    await cache_manager.invalidate_user(user_id)
 
     return {"message": "Пользователь разблокирован"}
 
@@ -393,21 +455,10 @@ async def delete_user(
 ):
     """Удалить пользователя (soft delete)"""
 
-    result = await db.execute(
-        select(User).where(User.id == user_id)
-    )
-    user = result.scalar_one_or_none()
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-
     # Soft delete
-    user.is_active = False
-    user.deleted_at = datetime.utcnow()
+    await update_user_or_404(db, user_id, is_active=False, deleted_at=datetime.utcnow())
 
     await db.commit()
+    await cache_manager.invalidate_user(user_id)
 
     return {"message": "Пользователь удален"}
\ No newline at end of file
@@ -2,9 +2,52 @@
 Pydantic схемы для валидации данных API
 """
 from pydantic import BaseModel, EmailStr, Field, ConfigDict, ValidationInfo, field_validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, ClassVar
 from datetime import datetime
 from enum import Enum
+import re
+import sys
+
+# Шаблоны валидации компилируются один раз при импорте
+_PASSWORD_DIGIT_RE = re.compile(r"\d")
+
+
+# Общий конфиг схем, читаемых из ORM. Схема pydantic-core строится при
+# первом использовании, а не при импорте модуля: воркеру Celery и скриптам
+# не нужны десятки схем ответов API
+ORM_CONFIG = ConfigDict(from_attributes=True, defer_build=True)
+
+_MISSING = object()
+
+
+class TrustedORMResponse(BaseModel):
+    """
+    Базовая схема ответа, которую можно собрать из строки БД без валидации.
+
+    Данные из БД уже соответствуют типам колонок, поэтому from_orm_fast
+    использует model_construct: read-only списки не тратят CPU на повторную
+    проверку каждого поля. Enum значения приводятся к их value, как при
+    обычной валидации.
+    """
+    model_config = ORM_CONFIG
+
+    _field_names: ClassVar[tuple[str, ...]] = ()
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        cls._field_names = tuple(cls.model_fields)
+
+    @classmethod
+    def from_orm_fast(cls, obj: Any):
+        """Собрать ответ из ORM объекта или строки Core без валидации"""
+        values = {}
+        for name in cls._field_names:
+            value = getattr(obj, name, _MISSING)
+            if value is _MISSING:
+                continue
+            values[name] = value.value if isinstance(value, Enum) else value
+        return cls.model_construct(**values)
 
 
 # ===== ENUMS =====
@@ -29,6 +72,10 @@ class TaskTypeEnum(str, Enum):
     ART = "art"
 
 
+# Канонические значения типов заданий (интернированные строки)
+_TASK_TYPE_VALUES = {sys.intern(t.value): sys.intern(t.value) for t in TaskTypeEnum}
+
+
 class SubmissionStatusEnum(str, Enum):
     PENDING = "pending"
     PROCESSING = "processing"
@@ -52,9 +99,10 @@ class UserCreate(UserBase):
     def validate_password(cls, v: str) -> str:
         if len(v) < 8:
             raise ValueError('Password must be at least 8 characters')
-        if not any(c.isupper() for c in v):
+        # lower() меняет строку только если в ней есть заглавные буквы (включая кириллицу)
+        if v.lower() == v:
             raise ValueError('Password must contain at least one uppercase letter')
-        if not any(c.isdigit() for c in v):
+        if _PASSWORD_DIGIT_RE.search(v) is None:
             raise ValueError('Password must contain at least one digit')
         return v
 
@@ -73,8 +121,8 @@ class UserUpdate(BaseModel):
     theme: Optional[str] = None
 
 
-class UserResponse(BaseModel):
-    model_config = ConfigDict(from_attributes=True)  # ВАЖНО
+class UserResponse(TrustedORMResponse):
+    model_config = ORM_CONFIG  # ВАЖНО
 
     id: int
     username: str
@@ -144,6 +192,12 @@ class TaskBase(BaseModel):
     @field_validator("task_type", mode="before")
     def normalize_task_type(cls, value: Any) -> str:
         """Normalize task_type values from a variety of legacy sources."""
+        # Fast path: the value is already a canonical task type string.
+        if value.__class__ is str:
+            canonical = _TASK_TYPE_VALUES.get(value)
+            if canonical is not None:
+                return canonical
+
         if value is None:
             return "general"
 
@@ -221,12 +275,21 @@ class TaskResponse(TaskBase):
     created_at: datetime
     assigned_users: List[TaskAssigneeInfo] = Field(default_factory=list)
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 class TaskListResponse(BaseModel):
     """Унифицированный список заданий с общей статистикой."""
 
     items: List[TaskResponse]
     total: int
+    next_cursor: Optional[str] = None
+
+
+class TaskFiltersResponse(BaseModel):
+    """Значения для фильтров списка заданий."""
+
+    subjects: List[str]
+    types: List[str]
+
 class TaskAssignmentRequest(BaseModel):
     user_ids: List[int] = Field(..., min_length=1)
 # ===== SUBMISSION SCHEMAS =====
@@ -256,7 +319,7 @@ class SubmissionResponse(BaseModel):
     processing_time: Optional[float]
     attempt_number: int
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 class SubmissionDetail(SubmissionResponse):
@@ -266,6 +329,15 @@ class SubmissionDetail(SubmissionResponse):
     teacher_feedback: Optional[str]
     reviewed_at: Optional[datetime]
 
+class SubmissionStatusResponse(BaseModel):
+    """Статус асинхронной проверки сдачи."""
+
+    id: int
+    status: SubmissionStatusEnum
+    score: Optional[float] = None
+    processing_time: Optional[float] = None
+
+
 class HtmlSubmissionRequest(BaseModel):
     """Результат выполнения задания в HTML-формате."""
 
@@ -325,7 +397,7 @@ class ShopItemResponse(ShopItemBase):
     rating: Optional[float]
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 class PurchaseCreate(BaseModel):
@@ -342,7 +414,7 @@ class PurchaseResponse(BaseModel):
     status: str
     purchased_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 # ===== ACHIEVEMENT SCHEMAS =====
@@ -374,7 +446,7 @@ class AchievementResponse(AchievementBase):
     is_active: bool
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 class UserAchievementResponse(BaseModel):
@@ -383,7 +455,7 @@ class UserAchievementResponse(BaseModel):
     progress: int
     is_claimed: bool
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 # ===== ANALYTICS SCHEMAS =====
@@ -441,7 +513,7 @@ class NotificationResponse(NotificationCreate):
     created_at: datetime
     read_at: Optional[datetime]
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 # ===== LEADERBOARD SCHEMAS =====
@@ -461,7 +533,7 @@ class LeaderboardEntry(BaseModel):
 
 # ===== TRANSACTION SCHEMAS =====
 
-class TransactionResponse(BaseModel):
+class TransactionResponse(TrustedORMResponse):
     id: int
     user_id: int
     coins_amount: int
@@ -474,7 +546,7 @@ class TransactionResponse(BaseModel):
     gems_balance: Optional[int]
     created_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ORM_CONFIG
 
 
 # ===== ADMIN SCHEMAS =====
@@ -497,4 +569,4 @@ class AdminUserSummary(BaseModel):
     email: str
     role: str
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ORM_CONFIG
\ No newline at end of file
@@ -3,39 +3,203 @@
 с retry логикой, кэшированием и обработкой ошибок
 """
 import base64
+import os
 import json
 import time
 import asyncio
+import functools
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageEnhance, ImageOps
 import cv2
 import numpy as np
 import pytesseract
-from openai import AsyncOpenAI
-from tenacity import retry, stop_after_attempt, wait_exponential
+import httpx
+from openai import (
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+)
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 import hashlib
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import Enum
 
+try:
+    from openai import DefaultAioHttpClient
+except ImportError:  # pragma: no cover - есть только в новых версиях openai
+    DefaultAioHttpClient = None
+
 from app.config import settings
 from app.utils.cache import cache_manager, cache_result
+from app.services.storage import vision_photo_url
 
 logger = logging.getLogger(__name__)
 
+# Tesseract по умолчанию занимает все ядра через OpenMP; проходы OCR и так
+# идут параллельно в пуле потоков, поэтому каждому процессу хватит одного
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+# Отдельный пул для OCR и обработки изображений: тяжелая CPU работа не
+# занимает стандартный пул asyncio.to_thread (хеширование паролей и т.п.),
+# а число одновременных проходов tesseract ограничено
+_AI_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.AI_CHECKER_THREADS,
+    thread_name_prefix="ai-checker",
+)
+
+
+async def run_blocking(func, *args):
+    """Выполнить блокирующую функцию в пуле AI чекера"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_AI_EXECUTOR, functools.partial(func, *args))
+
+
+@functools.lru_cache(maxsize=1024)
+def task_digest(task_description: str) -> str:
+    """Короткий хеш описания задания для ключа кэша проверки"""
+    return hashlib.blake2b(task_description.encode(), digest_size=16).hexdigest()
+
+
+# Регулярные выражения очистки OCR текста компилируются один раз
+WHITESPACE_RE = re.compile(r'\s+')
+LEADING_SYMBOLS_RE = re.compile(r'^[^\w\s]+', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=1024)
+def task_word_set(task_description: str) -> frozenset:
+    """Множество слов описания задания (одно задание проверяется много раз)"""
+    return frozenset(task_description.lower().split())
+
+
+# MinHash подписи работ для проверки на плагиат: вместо посимвольного
+# сравнения с каждой прошлой работой (SequenceMatcher, O(N*M) на Python)
+# сравниваются 128 чисел, а в Redis хранится ~0.7 КБ вместо полного текста
+PLAGIARISM_SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 128
+_MINHASH_PRIME = (1 << 31) - 1
+# Фиксированный seed: подписи сравниваются между процессами и перезапусками
+_minhash_rng = np.random.RandomState(20240607)
+_MINHASH_A = _minhash_rng.randint(1, _MINHASH_PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_MINHASH_B = _minhash_rng.randint(0, _MINHASH_PRIME, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+
+def minhash_signature(text: str) -> Optional[np.ndarray]:
+    """MinHash подпись по символьным шинглам текста (None для пустого текста)"""
+    text = text.lower()
+    if not text:
+        return None
+
+    size = PLAGIARISM_SHINGLE_SIZE
+    shingles = {text[i:i + size] for i in range(max(len(text) - size + 1, 1))}
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    ) % _MINHASH_PRIME
+
+    permuted = (np.outer(hashes, _MINHASH_A) + _MINHASH_B) % _MINHASH_PRIME
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature: np.ndarray) -> str:
+    return base64.b64encode(signature.tobytes()).decode('ascii')
+
+
+def decode_signature(value: str) -> Optional[np.ndarray]:
+    try:
+        signature = np.frombuffer(base64.b64decode(value, validate=True), dtype=np.uint32)
+    except (ValueError, TypeError):
+        return None
+    return signature if signature.size == MINHASH_PERMUTATIONS else None
+
+
+PHOTO_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Шаблоны промптов - константы модуля без отступов исходного кода:
+# лишние пробелы в каждой строке - это лишние токены в каждом запросе к API
+ADVANCED_PROMPT_TEMPLATE = """\
+Проверь работу ученика по фотографии.
+
+ЗАДАНИЕ:
+{task_description}
+
+ТИП ЗАДАНИЯ: {task_type}
+
+КРИТЕРИИ ОЦЕНКИ:
+{checking_criteria}
+
+ИНСТРУКЦИИ:
+1. Внимательно изучи фотографию работы и перепиши ее текст
+2. Оцени правильность решения/ответа
+3. Проверь полноту раскрытия темы
+4. Оцени оформление и читаемость
+5. Дай конструктивную обратную связь
+
+Верни результат в формате JSON:
+{{
+    "recognized_text": "текст работы так, как он написан на фото",
+    "score": 0-100,
+    "feedback": "общая оценка работы",
+    "detailed_analysis": {{
+        "правильные_моменты": ["список правильных элементов"],
+        "ошибки": ["список ошибок с пояснениями"],
+        "оформление": "оценка оформления",
+        "полнота": "насколько полно раскрыта тема",
+        "рекомендации": ["что можно улучшить"]
+    }},
+    "confidence": 0.0-1.0,
+    "suggestions": ["конкретные советы ученику"]
+}}
+"""
+
+STANDARD_PROMPT_TEMPLATE = """\
+Задание: {task_description}
+Тип: {task_type}
+
+Ответ ученика:
+{recognized_text}
+
+Оцени работу и верни JSON:
+{{
+    "score": число 0-100,
+    "feedback": "краткий отзыв",
+    "detailed_analysis": {{
+        "правильные_моменты": [],
+        "ошибки": [],
+        "рекомендации": []
+    }},
+    "confidence": число 0-1,
+    "suggestions": []
+}}
+"""
+
 
 class CheckingQuality(Enum):
     """Уровни качества проверки"""
     BASIC = "basic"      # Только OCR
     STANDARD = "standard"  # OCR + базовый AI
-    ADVANCED = "advanced"  # OCR + GPT-4 Vision
+    ADVANCED = "advanced"  # GPT-4 Vision читает фото без OCR
     PREMIUM = "premium"   # Полный анализ с плагиат-чеком
 
 
-@dataclass
+# Уровни, на которых работу читает Vision модель, а не Tesseract
+VISION_QUALITIES = frozenset({CheckingQuality.ADVANCED, CheckingQuality.PREMIUM})
+# В режиме detail=low модель смотрит на фото 512x512 - больше не отправляем
+VISION_LOW_DETAIL_SIDE = 512
+
+
+@dataclass(slots=True)
 class CheckingResult:
-    """Результат проверки"""
+    """Результат проверки (slots: без __dict__ на каждый объект)"""
     recognized_text: str
     score: float
     feedback: str
@@ -47,21 +211,69 @@ class CheckingResult:
     suggestions: List[str]
     plagiarism_score: Optional[float] = None
 
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Поля результата для кэша (без глубокого копирования, как в asdict)
+
+        Уровень качества хранится значением enum - словарь сериализуется
+        в JSON для Redis как есть.
+        """
+        data = {name: getattr(self, name) for name in CHECKING_RESULT_FIELDS}
+        data["quality_level"] = self.quality_level.value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **overrides: Any) -> "CheckingResult":
+        """Восстановить результат из кэша"""
+        result = cls(**{**data, **overrides})
+        result.quality_level = CheckingQuality(result.quality_level)
+        return result
+
+
+CHECKING_RESULT_FIELDS = tuple(f.name for f in fields(CheckingResult))
+
+
+# Ширина копии страницы, по которой оценивается угол наклона
+DESKEW_SAMPLE_WIDTH = 512
+
 
 class ImagePreprocessor:
     """Предобработка изображений для улучшения OCR"""
 
     @staticmethod
-    def preprocess(image_path: str) -> np.ndarray:
-        """Комплексная предобработка изображения"""
-        # Читаем изображение
-        img = cv2.imread(image_path)
+    def load_grayscale(image_path: str) -> np.ndarray:
+        """
+        Прочитать фото один раз сразу в grayscale
 
-        # Конвертируем в grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        Оба прохода OCR работают с оттенками серого, поэтому файл
+        декодируется один раз и без трехканальной копии.
+        """
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("Не удалось прочитать изображение")
+
+        # Фото с телефона (4000x3000) уменьшаем: время Tesseract растет
+        # с числом пикселей, а точность выше ~300 DPI уже не улучшается
+        scale = settings.OCR_MAX_SIDE / max(gray.shape[:2])
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        return gray
+
+    @staticmethod
+    def preprocess(gray: np.ndarray, thorough: bool = False) -> np.ndarray:
+        """
+        Комплексная предобработка изображения
 
+        thorough - медленное NL-means шумоподавление (секунды на фото с
+        телефона). Для обычных проверок хватает билатерального фильтра:
+        мелкий шум все равно убирает адаптивная бинаризация.
+        """
         # Убираем шум
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        if thorough:
+            denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        else:
+            denoised = cv2.bilateralFilter(gray, 5, 50, 50)
 
         # Адаптивная бинаризация
         binary = cv2.adaptiveThreshold(
@@ -82,7 +294,24 @@ class ImagePreprocessor:
     @staticmethod
     def _deskew(image: np.ndarray) -> np.ndarray:
         """Выравнивание наклоненного текста"""
-        coords = np.column_stack(np.where(image > 0))
+        (h, w) = image.shape[:2]
+
+        # Угол наклона не зависит от масштаба - оцениваем его по уменьшенной
+        # копии, а поворачиваем оригинал
+        sample = image
+        if w > DESKEW_SAMPLE_WIDTH:
+            sample = cv2.resize(
+                image,
+                (DESKEW_SAMPLE_WIDTH, max(1, h * DESKEW_SAMPLE_WIDTH // w)),
+                interpolation=cv2.INTER_AREA
+            )
+
+        # findNonZero отдает компактный int32 массив (x, y) без промежуточных
+        # массивов np.where; переставляем в (строка, столбец), как раньше
+        points = cv2.findNonZero(sample)
+        if points is None:
+            return image
+        coords = np.ascontiguousarray(points.reshape(-1, 2)[:, ::-1])
         angle = cv2.minAreaRect(coords)[-1]
 
         if angle < -45:
@@ -90,7 +319,6 @@ class ImagePreprocessor:
         else:
             angle = -angle
 
-        (h, w) = image.shape[:2]
         center = (w // 2, h // 2)
         M = cv2.getRotationMatrix2D(center, angle, 1.0)
         rotated = cv2.warpAffine(
@@ -102,21 +330,18 @@ class ImagePreprocessor:
         return rotated
 
     @staticmethod
-    def enhance_contrast(image_path: str) -> Image.Image:
+    def enhance_contrast(gray: np.ndarray) -> Image.Image:
         """Улучшение контраста для PIL"""
-        from PIL import ImageEnhance, ImageOps
-
-        image = Image.open(image_path)
-
-        # Конвертируем в grayscale
-        image = image.convert('L')
+        image = Image.fromarray(gray)
 
         # Автоматическая коррекция уровней
         image = ImageOps.autocontrast(image)
 
-        # Увеличиваем контраст
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(2.0)
+        # Увеличиваем контраст: то же, что ImageEnhance.Contrast(2.0), но
+        # одним проходом по таблице из 256 значений вместо blend двух копий
+        histogram = image.histogram()
+        mean = int(sum(i * count for i, count in enumerate(histogram)) / max(sum(histogram), 1) + 0.5)
+        image = image.point([min(max(2 * i - mean, 0), 255) for i in range(256)])
 
         # Увеличиваем резкость
         enhancer = ImageEnhance.Sharpness(image)
@@ -124,13 +349,83 @@ class ImagePreprocessor:
 
         return image
 
+    @staticmethod
+    def downscale_for_vision(image_path: str, max_side: int) -> bytes:
+        """
+        Уменьшить фото для Vision модели и вернуть JPEG байты.
+
+        Модель все равно масштабирует изображение до ~1024px, поэтому
+        отправлять 12-мегапиксельные фото с телефона незачем. OCR работает
+        с оригиналом - уменьшение касается только запроса к API.
+        """
+        with Image.open(image_path) as image:
+            # Фото с телефона часто повернуты через EXIF
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            buffer = BytesIO()
+            image.convert('RGB').save(buffer, format='JPEG', quality=80, optimize=True)
+
+        return buffer.getvalue()
+
+
+def build_openai_http_client() -> httpx.AsyncClient:
+    """
+    HTTP клиент для OpenAI с явным пулом соединений
+
+    Один клиент на процесс: соединения с API переиспользуются между
+    проверками. Транспорт aiohttp держит нагрузку сотен одновременных
+    запросов лучше httpx, но требует дополнительной зависимости.
+    """
+    limits = httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS // 2,
+    )
+    if settings.OPENAI_HTTP_BACKEND == "aiohttp" and DefaultAioHttpClient is not None:
+        try:
+            return DefaultAioHttpClient(limits=limits)
+        except RuntimeError:
+            logger.warning("openai[aiohttp] is not installed, falling back to httpx")
+    return DefaultAsyncHttpxClient(limits=limits)
+
+
+# Повторяем только сбои сети и 5xx. 429 повторяет сам SDK с учетом
+# Retry-After, а ошибки запроса (400, 401) повтор не исправит
+TRANSIENT_OPENAI_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError)
+
 
 class AIPhotoChecker:
     """Улучшенный сервис проверки с retry и кэшированием"""
 
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
         self.preprocessor = ImagePreprocessor()
+        self._open_client()
+
+    def _open_client(self) -> None:
+        """Создать клиент OpenAI и ограничитель одновременных запросов"""
+        self.client = (
+            AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=build_openai_http_client())
+            if settings.OPENAI_API_KEY
+            else None
+        )
+        # Ограничение одновременных запросов к OpenAI: при массовой сдаче
+        # работ запросы ждут очереди, а не упираются в rate limit
+        self._openai_slots = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+
+    async def aclose(self) -> None:
+        """Закрыть соединения с OpenAI при остановке приложения"""
+        if self.client is not None:
+            await self.client.close()
+
+    async def reopen(self) -> None:
+        """
+        Закрыть клиент и создать новый вместе с семафором
+
+        Клиент и семафор привязываются к event loop, а воркер Celery
+        запускает каждую задачу в своем asyncio.run.
+        """
+        await self.aclose()
+        self._open_client()
 
     async def check_photo_submission(
         self,
@@ -139,47 +434,65 @@ class AIPhotoChecker:
         task_type: str,
         checking_criteria: str,
         user_id: int,
-        quality: CheckingQuality = CheckingQuality.STANDARD
+        quality: CheckingQuality = CheckingQuality.STANDARD,
+        photo_hash: Optional[str] = None,
+        photo_location: Optional[str] = None
     ) -> CheckingResult:
         """
         Главный метод проверки с выбором уровня качества
+
+        photo_hash - sha256 содержимого фото, если уже посчитан при загрузке.
+        photo_location - исходное место хранения фото (s3://...): Vision модель
+        получает на него временную ссылку вместо base64 содержимого.
         """
         start_time = time.time()
 
         # Генерируем хеш для кэширования
-        cache_key = self._generate_cache_key(photo_path, task_description)
+        cache_key = await run_blocking(
+            self._generate_cache_key, photo_path, task_description, user_id, quality, photo_hash
+        )
 
         # Проверяем кэш
         cached_result = await cache_manager.get(f"check:{cache_key}")
         if cached_result and not settings.DEBUG:
-            logger.info(f"Using cached result for {cache_key}")
-            return CheckingResult(**cached_result)
+            logger.info("Using cached result for %s", cache_key)
+            return CheckingResult.from_dict(
+                cached_result, processing_time=time.time() - start_time
+            )
 
         try:
-            # Предобработка изображения
-            processed_image = self.preprocessor.preprocess(photo_path)
-
-            # OCR с несколькими попытками
-            recognized_text = await self._perform_ocr(photo_path, processed_image)
-
             # Выбираем метод проверки в зависимости от quality
-            if quality == CheckingQuality.BASIC:
-                result = await self._basic_analysis(recognized_text, task_description)
-            elif quality == CheckingQuality.ADVANCED or quality == CheckingQuality.PREMIUM:
+            if quality in VISION_QUALITIES and self.client:
+                # Vision модель сама читает рукописный текст с фото - OCR не
+                # нужен, текст работы приходит в том же ответе
+                detail = "high" if quality == CheckingQuality.PREMIUM else settings.AI_VISION_DETAIL
                 result = await self._advanced_analysis(
-                    photo_path, recognized_text, task_description,
-                    task_type, checking_criteria
+                    photo_path, task_description, task_type,
+                    checking_criteria, photo_location, detail
                 )
-
-                # Для PREMIUM добавляем проверку на плагиат
-                if quality == CheckingQuality.PREMIUM:
-                    plagiarism_score = await self._check_plagiarism(recognized_text, user_id)
-                    result["plagiarism_score"] = plagiarism_score
-            else:  # STANDARD
-                result = await self._standard_analysis(
-                    recognized_text, task_description, task_type
+                recognized_text = self._clean_ocr_text(str(result.pop("recognized_text", "") or ""))
+            else:
+                # Предобработка изображения (OpenCV блокирующий - выполняем в потоке)
+                gray = await run_blocking(self.preprocessor.load_grayscale, photo_path)
+                processed_image = await run_blocking(
+                    self.preprocessor.preprocess, gray, quality == CheckingQuality.PREMIUM
                 )
 
+                # OCR с несколькими попытками
+                recognized_text = await self._perform_ocr(gray, processed_image)
+
+                if quality == CheckingQuality.BASIC:
+                    result = await self._basic_analysis(recognized_text, task_description)
+                else:  # STANDARD, или Vision недоступна без API ключа
+                    result = await self._standard_analysis(
+                        recognized_text, task_description, task_type
+                    )
+
+            # Для PREMIUM добавляем проверку на плагиат
+            if quality == CheckingQuality.PREMIUM:
+                plagiarism_score = await self._check_plagiarism(recognized_text, user_id)
+                result["plagiarism_score"] = plagiarism_score
+
             processing_time = time.time() - start_time
 
             # Формируем результат
@@ -199,14 +512,14 @@ class AIPhotoChecker:
             # Кэшируем результат
             await cache_manager.set(
                 f"check:{cache_key}",
-                checking_result.__dict__,
+                checking_result.as_dict(),
                 ttl=3600  # 1 час
             )
 
             return checking_result
 
         except Exception as e:
-            logger.error(f"Error checking submission: {e}")
+            logger.exception("Error checking submission: %s", e)
             return CheckingResult(
                 recognized_text="",
                 score=0,
@@ -219,32 +532,46 @@ class AIPhotoChecker:
                 suggestions=["Попробуйте загрузить более четкое фото"]
             )
 
-    async def _perform_ocr(self, photo_path: str, processed_image: np.ndarray) -> str:
-        """OCR с несколькими методами"""
-        texts = []
+    async def _perform_ocr(self, gray: np.ndarray, processed_image: np.ndarray) -> str:
+        """
+        OCR с несколькими методами
+
+        Tesseract блокирующий, поэтому оба прохода запускаются в потоках
+        параллельно и не занимают event loop, обслуживающий другие запросы.
+        """
+        engine = f'--oem {settings.OCR_ENGINE_MODE}'
 
         # Метод 1: Обработанное изображение
-        try:
-            text1 = pytesseract.image_to_string(
+        def ocr_processed() -> str:
+            return pytesseract.image_to_string(
                 processed_image,
                 lang=settings.OCR_LANGUAGE,
-                config='--psm 6'  # Uniform block of text
+                config=f'{engine} --psm 6',  # Uniform block of text
+                timeout=settings.OCR_TIMEOUT
             )
-            texts.append(text1)
-        except Exception as e:
-            logger.warning(f"OCR method 1 failed: {e}")
 
         # Метод 2: Оригинальное изображение с улучшением контраста
-        try:
-            enhanced = self.preprocessor.enhance_contrast(photo_path)
-            text2 = pytesseract.image_to_string(
+        def ocr_enhanced() -> str:
+            enhanced = self.preprocessor.enhance_contrast(gray)
+            return pytesseract.image_to_string(
                 enhanced,
                 lang=settings.OCR_LANGUAGE,
-                config='--psm 3'  # Fully automatic
+                config=f'{engine} --psm 3',  # Fully automatic
+                timeout=settings.OCR_TIMEOUT
             )
-            texts.append(text2)
-        except Exception as e:
-            logger.warning(f"OCR method 2 failed: {e}")
+
+        results = await asyncio.gather(
+            run_blocking(ocr_processed),
+            run_blocking(ocr_enhanced),
+            return_exceptions=True
+        )
+
+        texts = []
+        for method, result in enumerate(results, start=1):
+            if isinstance(result, Exception):
+                logger.warning("OCR method %s failed: %s", method, result)
+            else:
+                texts.append(result)
 
         # Выбираем лучший результат
         best_text = max(texts, key=len) if texts else ""
@@ -256,73 +583,83 @@ class AIPhotoChecker:
 
     def _clean_ocr_text(self, text: str) -> str:
         """Очистка распознанного текста"""
-        # Убираем лишние символы
-        import re
-
         # Убираем множественные пробелы
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_RE.sub(' ', text)
 
         # Убираем специальные символы в начале строк
-        text = re.sub(r'^[^\w\s]+', '', text, flags=re.MULTILINE)
-
-        # Исправляем частые ошибки OCR
-        replacements = {
-            '|': 'I',
-            '0': 'O',  # если в контексте букв
-            '1': 'l',  # если в контексте букв
-        }
+        text = LEADING_SYMBOLS_RE.sub('', text)
 
         return text.strip()
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     async def _advanced_analysis(
         self,
         photo_path: str,
-        recognized_text: str,
         task_description: str,
         task_type: str,
-        checking_criteria: str
+        checking_criteria: str,
+        photo_location: Optional[str] = None,
+        detail: str = "high"
     ) -> Dict[str, Any]:
-        """Продвинутый анализ с GPT-4 Vision и retry"""
+        """
+        Продвинутый анализ с GPT-4 Vision
+
+        Изображение готовится один раз, повторяется только запрос к API.
+        """
+
+        image_url = await vision_photo_url(photo_location) if photo_location else None
+        if image_url is None:
+            max_side = settings.AI_VISION_MAX_SIDE
+            if detail == "low":
+                max_side = min(max_side, VISION_LOW_DETAIL_SIDE)
 
-        # Кодируем изображение
-        with open(photo_path, "rb") as image_file:
-            base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            # Кодируем уменьшенное изображение (ресайз - CPU работа, выносим из event loop)
+            image_bytes = await run_blocking(
+                self.preprocessor.downscale_for_vision, photo_path, max_side
+            )
+            image_url = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('ascii')}"
 
         # Создаем промпт
         prompt = self._create_advanced_prompt(
-            task_description, task_type, checking_criteria, recognized_text
+            task_description, task_type, checking_criteria
         )
 
+        return await self._request_vision_check(prompt, image_url, detail)
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(TRANSIENT_OPENAI_ERRORS)
+    )
+    async def _request_vision_check(self, prompt: str, image_url: str, detail: str) -> Dict[str, Any]:
+        """Запрос к GPT-4 Vision с retry"""
+
         # Запрос к GPT-4 Vision
-        response = await self.client.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Ты опытный преподаватель, проверяющий работы учеников. Будь объективным, но доброжелательным."
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}",
-                                "detail": "high"
+        async with self._openai_slots:
+            response = await self.client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "Ты опытный преподаватель, проверяющий работы учеников. Будь объективным, но доброжелательным."
+                    },
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": image_url,
+                                    "detail": detail
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=2000,
-            temperature=settings.AI_TEMPERATURE,
-            response_format={"type": "json_object"}
-        )
+                        ]
+                    }
+                ],
+                max_tokens=2000,
+                temperature=settings.AI_TEMPERATURE,
+                response_format={"type": "json_object"}
+            )
 
         # Парсим результат
         result = json.loads(response.choices[0].message.content)
@@ -342,46 +679,32 @@ class AIPhotoChecker:
 
         try:
             # Запрос к GPT без изображения
-            response = await self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Более дешевая модель
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Проверь работу ученика и дай оценку от 0 до 100."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""
-                        Задание: {task_description}
-                        Тип: {task_type}
-                        
-                        Ответ ученика:
-                        {recognized_text}
-                        
-                        Оцени работу и верни JSON:
-                        {{
-                            "score": число 0-100,
-                            "feedback": "краткий отзыв",
-                            "detailed_analysis": {{
-                                "правильные_моменты": [],
-                                "ошибки": [],
-                                "рекомендации": []
-                            }},
-                            "confidence": число 0-1,
-                            "suggestions": []
-                        }}
-                        """
-                    }
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
+            async with self._openai_slots:
+                response = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",  # Более дешевая модель
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "Проверь работу ученика и дай оценку от 0 до 100."
+                        },
+                        {
+                            "role": "user",
+                            "content": STANDARD_PROMPT_TEMPLATE.format_map({
+                                "task_description": task_description,
+                                "task_type": task_type,
+                                "recognized_text": recognized_text,
+                            })
+                        }
+                    ],
+                    temperature=0.3,
+                    response_format={"type": "json_object"}
+                )
 
             result = json.loads(response.choices[0].message.content)
             return self._validate_ai_response(result)
 
         except Exception as e:
-            logger.error(f"Standard analysis error: {e}")
+            logger.exception("Standard analysis error: %s", e)
             return await self._basic_analysis(recognized_text, task_description)
 
     async def _basic_analysis(
@@ -404,10 +727,10 @@ class AIPhotoChecker:
             feedback_parts.append("❌ Работа слишком короткая")
             suggestions.append("Напишите более развернутый ответ")
 
-        # Проверка ключевых слов
-        task_words = set(task_description.lower().split())
-        text_words = set(recognized_text.lower().split())
-        common_words = task_words & text_words
+        # Проверка ключевых слов: слова задания кэшируются между сдачами,
+        # из текста работы множество не строится - только поиск совпадений
+        task_words = task_word_set(task_description)
+        common_words = task_words.intersection(recognized_text.lower().split())
 
         relevance_score = len(common_words) / max(len(task_words), 1)
         score += int(relevance_score * 40)
@@ -434,75 +757,45 @@ class AIPhotoChecker:
         }
 
     async def _check_plagiarism(self, text: str, user_id: int) -> float:
-        """Проверка на плагиат (сравнение с предыдущими работами)"""
+        """
+        Проверка на плагиат (сравнение с предыдущими работами)
 
-        # Получаем хеш текста
-        text_hash = hashlib.md5(text.encode()).hexdigest()
+        Схожесть - оценка коэффициента Жаккара по MinHash подписям
+        символьных шинглов: доля совпавших минимумов из 128.
+        """
+        signature = await run_blocking(minhash_signature, text)
+        if signature is None:
+            return 100.0
 
-        # Проверяем в кэше похожие работы
-        similar_works = await cache_manager.lrange(f"works:{user_id}", 0, 100)
+        # Подписи предыдущих работ ученика
+        key = f"work_signatures:{user_id}"
+        stored = await cache_manager.lrange(key, 0, 100)
+        previous = [s for s in map(decode_signature, stored) if s is not None]
 
         max_similarity = 0.0
-        for work in similar_works:
-            similarity = self._calculate_similarity(text, work)
-            max_similarity = max(max_similarity, similarity)
+        if previous:
+            # Все прошлые работы сравниваются одной операцией над матрицей
+            max_similarity = float((np.vstack(previous) == signature).mean(axis=1).max())
 
-        # Сохраняем текущую работу
-        await cache_manager.lpush(f"works:{user_id}", text)
+        # Сохраняем подпись текущей работы
+        await cache_manager.lpush(key, encode_signature(signature))
 
         # Возвращаем процент уникальности
         return 100 - (max_similarity * 100)
 
-    def _calculate_similarity(self, text1: str, text2: str) -> float:
-        """Расчет схожести текстов (простой метод)"""
-        from difflib import SequenceMatcher
-        return SequenceMatcher(None, text1, text2).ratio()
-
     def _create_advanced_prompt(
         self,
         task_description: str,
         task_type: str,
-        checking_criteria: str,
-        recognized_text: str
+        checking_criteria: str
     ) -> str:
         """Создание детального промпта для GPT-4"""
 
-        return f"""
-        Проверь работу ученика по фотографии.
-        
-        ЗАДАНИЕ:
-        {task_description}
-        
-        ТИП ЗАДАНИЯ: {task_type}
-        
-        КРИТЕРИИ ОЦЕНКИ:
-        {checking_criteria}
-        
-        РАСПОЗНАННЫЙ ТЕКСТ (может быть неполным):
-        {recognized_text}
-        
-        ИНСТРУКЦИИ:
-        1. Внимательно изучи фотографию работы
-        2. Оцени правильность решения/ответа
-        3. Проверь полноту раскрытия темы
-        4. Оцени оформление и читаемость
-        5. Дай конструктивную обратную связь
-        
-        Верни результат в формате JSON:
-        {{
-            "score": 0-100,
-            "feedback": "общая оценка работы",
-            "detailed_analysis": {{
-                "правильные_моменты": ["список правильных элементов"],
-                "ошибки": ["список ошибок с пояснениями"],
-                "оформление": "оценка оформления",
-                "полнота": "насколько полно раскрыта тема",
-                "рекомендации": ["что можно улучшить"]
-            }},
-            "confidence": 0.0-1.0,
-            "suggestions": ["конкретные советы ученику"]
-        }}
-        """
+        return ADVANCED_PROMPT_TEMPLATE.format_map({
+            "task_description": task_description,
+            "task_type": task_type,
+            "checking_criteria": checking_criteria,
+        })
 
     def _validate_ai_response(self, response: Dict[str, Any]) -> Dict[str, Any]:
         """Валидация и нормализация ответа AI"""
@@ -537,15 +830,30 @@ class AIPhotoChecker:
         }
         return defaults.get(field, None)
 
-    def _generate_cache_key(self, photo_path: str, task_description: str) -> str:
-        """Генерация ключа для кэша"""
-        # Читаем первые 1024 байта файла для хеша
-        with open(photo_path, 'rb') as f:
-            file_hash = hashlib.md5(f.read(1024)).hexdigest()
-
-        task_hash = hashlib.md5(task_description.encode()).hexdigest()
+    def _generate_cache_key(
+        self,
+        photo_path: str,
+        task_description: str,
+        user_id: int,
+        quality: CheckingQuality = CheckingQuality.STANDARD,
+        photo_hash: Optional[str] = None
+    ) -> str:
+        """
+        Генерация ключа для кэша
 
-        return f"{file_hash}:{task_hash}"
+        Ключ включает пользователя: то же фото от другого ученика - это
+        списывание, и результат автора ему не переиспользуется.
+        """
+        # Хеш всего содержимого: первые байты JPEG - это EXIF заголовок,
+        # одинаковый у разных фото с одного телефона
+        if photo_hash is None:
+            hasher = hashlib.sha256()
+            with open(photo_path, 'rb') as f:
+                while chunk := f.read(PHOTO_HASH_CHUNK_SIZE):
+                    hasher.update(chunk)
+            photo_hash = hasher.hexdigest()
+
+        return f"{photo_hash}:{task_digest(task_description)}:{user_id}:{quality.value}"
 
 
 # Глобальный экземпляр чекера
@@ -0,0 +1,149 @@
+"""
+Хранилище загруженных фото в S3/MinIO
+
+Включается, если задан S3_BUCKET_NAME и установлен aioboto3. Иначе фото
+сохраняются в локальный UPLOAD_DIR API процесса.
+"""
+import os
+import logging
+import tempfile
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Optional
+
+from app.config import settings
+
+try:
+    import aioboto3
+except ImportError:  # pragma: no cover - aioboto3 опционален
+    aioboto3 = None
+
+logger = logging.getLogger(__name__)
+
+S3_URI_PREFIX = "s3://"
+# S3 требует, чтобы все части multipart upload, кроме последней, были >= 5 MB
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+# Форматы, которые Vision модель принимает по ссылке (HEIC - нет)
+VISION_URL_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.webp'})
+# Ссылку нужно успеть скачать на стороне модели, не дольше
+VISION_URL_EXPIRES = 600
+
+
+def s3_enabled() -> bool:
+    """Настроено ли S3 хранилище"""
+    return aioboto3 is not None and bool(settings.S3_BUCKET_NAME)
+
+
+def s3_uri(key: str) -> str:
+    """URI объекта в бакете, хранится в сдаче вместо локального пути"""
+    return f"{S3_URI_PREFIX}{settings.S3_BUCKET_NAME}/{key}"
+
+
+def _s3_client():
+    session = aioboto3.Session(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+    )
+    return session.client("s3", endpoint_url=settings.S3_ENDPOINT_URL)
+
+
+async def upload_chunks_to_s3(chunks: AsyncIterator[bytes], key: str) -> int:
+    """
+    Потоково загрузить чанки в S3 через multipart upload.
+
+    Первый чанк читается до создания upload: ошибки валидации загрузки
+    не оставляют в бакете незавершенных multipart upload. Возвращает
+    размер объекта в байтах.
+    """
+    first_chunk = await anext(chunks)
+    bucket = settings.S3_BUCKET_NAME
+
+    async with _s3_client() as client:
+        upload = await client.create_multipart_upload(Bucket=bucket, Key=key)
+        upload_id = upload["UploadId"]
+        parts = []
+        buffer = bytearray(first_chunk)
+        size = len(first_chunk)
+
+        async def flush_part() -> None:
+            part_number = len(parts) + 1
+            part = await client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=bytes(buffer),
+            )
+            parts.append({"ETag": part["ETag"], "PartNumber": part_number})
+            buffer.clear()
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                buffer.extend(chunk)
+                if len(buffer) >= S3_MIN_PART_SIZE:
+                    await flush_part()
+
+            if buffer or not parts:
+                await flush_part()
+
+            await client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            with suppress(Exception):
+                await client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+
+    logger.info(f"Uploaded {size} bytes to {s3_uri(key)}")
+    return size
+
+
+@asynccontextmanager
+async def local_photo_path(location: str) -> AsyncIterator[str]:
+    """
+    Путь к локальному файлу фото для OCR/AI проверки.
+
+    Локальные пути отдаются как есть, объекты из S3 скачиваются
+    во временный файл, который удаляется после проверки.
+    """
+    if not location.startswith(S3_URI_PREFIX):
+        yield location
+        return
+
+    bucket, _, key = location[len(S3_URI_PREFIX):].partition("/")
+    fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+    os.close(fd)
+    try:
+        async with _s3_client() as client:
+            await client.download_file(bucket, key, tmp_path)
+        yield tmp_path
+    finally:
+        with suppress(OSError):
+            os.remove(tmp_path)
+
+
+async def vision_photo_url(location: str) -> Optional[str]:
+    """
+    Временная ссылка на фото в S3 для Vision модели.
+
+    Модель скачивает фото сама - API процесс не кодирует его в base64 и не
+    отправляет мегабайты в теле запроса. Для локальных файлов и форматов,
+    которые модель не принимает по ссылке, возвращается None.
+    """
+    if not location.startswith(S3_URI_PREFIX):
+        return None
+
+    bucket, _, key = location[len(S3_URI_PREFIX):].partition("/")
+    if os.path.splitext(key)[1].lower() not in VISION_URL_EXTENSIONS:
+        return None
+
+    async with _s3_client() as client:
+        return await client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=VISION_URL_EXPIRES,
+        )
@@ -5,34 +5,46 @@ from typing import Any
 import sys
 import types
 
+from sqlalchemy.sql import Select
+from sqlalchemy.sql import operators as sql_operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
 from app.models import TaskStatus
 
 
+# Stubs are built once at import; ensure_optional_deps_stubbed only registers them.
+_CV2_STUB = types.SimpleNamespace(
+    imread=lambda *args, **kwargs: None,
+    cvtColor=lambda *args, **kwargs: None,
+    fastNlMeansDenoising=lambda *args, **kwargs: None,
+    adaptiveThreshold=lambda *args, **kwargs: None,
+    morphologyEx=lambda *args, **kwargs: None,
+    minAreaRect=lambda coords: (None, None, 0),
+    getRotationMatrix2D=lambda *args, **kwargs: None,
+    warpAffine=lambda *args, **kwargs: None,
+    COLOR_BGR2GRAY=0,
+    ADAPTIVE_THRESH_GAUSSIAN_C=0,
+    THRESH_BINARY=0,
+    MORPH_CLOSE=0,
+    INTER_CUBIC=0,
+    BORDER_REPLICATE=0,
+    ml=types.SimpleNamespace(),
+)
+_PYTESSERACT_STUB = types.SimpleNamespace(image_to_string=lambda *args, **kwargs: "")
+_OPENAI_STUB = types.SimpleNamespace(
+    AsyncOpenAI=lambda *args, **kwargs: None,
+    DefaultAsyncHttpxClient=lambda *args, **kwargs: None,
+    APIConnectionError=type("APIConnectionError", (Exception,), {}),
+    APITimeoutError=type("APITimeoutError", (Exception,), {}),
+    InternalServerError=type("InternalServerError", (Exception,), {}),
+)
+
+
 def ensure_optional_deps_stubbed() -> None:
     """Register lightweight stubs for optional heavy dependencies."""
-    cv2_stub = types.SimpleNamespace(
-        imread=lambda *args, **kwargs: None,
-        cvtColor=lambda *args, **kwargs: None,
-        fastNlMeansDenoising=lambda *args, **kwargs: None,
-        adaptiveThreshold=lambda *args, **kwargs: None,
-        morphologyEx=lambda *args, **kwargs: None,
-        minAreaRect=lambda coords: (None, None, 0),
-        getRotationMatrix2D=lambda *args, **kwargs: None,
-        warpAffine=lambda *args, **kwargs: None,
-        COLOR_BGR2GRAY=0,
-        ADAPTIVE_THRESH_GAUSSIAN_C=0,
-        THRESH_BINARY=0,
-        MORPH_CLOSE=0,
-        INTER_CUBIC=0,
-        BORDER_REPLICATE=0,
-        ml=types.SimpleNamespace(),
-    )
-    pytesseract_stub = types.SimpleNamespace(image_to_string=lambda *args, **kwargs: "")
-    openai_stub = types.SimpleNamespace(AsyncOpenAI=lambda *args, **kwargs: None)
-
-    sys.modules.setdefault("cv2", cv2_stub)
-    sys.modules.setdefault("pytesseract", pytesseract_stub)
-    sys.modules.setdefault("openai", openai_stub)
+    sys.modules.setdefault("cv2", _CV2_STUB)
+    sys.modules.setdefault("pytesseract", _PYTESSERACT_STUB)
+    sys.modules.setdefault("openai", _OPENAI_STUB)
 
 
 class DummyTask:
@@ -67,6 +79,17 @@ class DummyTask:
         self.assignments = []
 
 
+class DummyWindowRow:
+    """Task row carrying the ``count() OVER ()`` column of a list query."""
+
+    def __init__(self, task: Any, total: int) -> None:
+        self._task = task
+        self.total = total
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._task, name)
+
+
 class DummyResult:
     def __init__(self, tasks: list[Any]) -> None:
         self._tasks = tasks
@@ -97,18 +120,17 @@ class DummyResult:
 class DummySession:
     def __init__(self, tasks: list[DummyTask]) -> None:
         self._tasks: list[Any] = list(tasks)
+        # Index by id: most statements filter on Task.id == X.
+        self._by_id: dict[Any, Any] = {
+            task.id: task for task in self._tasks if getattr(task, "id", None) is not None
+        }
         existing_ids = [getattr(task, "id", 0) for task in self._tasks]
         self._next_id = (max(existing_ids) if existing_ids else 0) + 1
 
     def _find_task(self, task_id: int) -> Any | None:
-        for task in self._tasks:
-            if getattr(task, "id", None) == task_id:
-                return task
-        return None
+        return self._by_id.get(task_id)
 
     def _resolve_bound_value(self, expression: Any) -> Any:
-        from sqlalchemy.sql.elements import BindParameter
-
         if expression is None:
             return None
         if isinstance(expression, BindParameter):
@@ -123,14 +145,10 @@ class DummySession:
         return None
 
     def _filter_tasks(self, statement: Any) -> list[Any]:
-        from sqlalchemy.sql import Select
-        from sqlalchemy.sql.elements import BinaryExpression
-        from sqlalchemy.sql import operators as sql_operators
-
         if not isinstance(statement, Select):
             return list(self._tasks)
 
-        filtered = list(self._tasks)
+        filtered: list[Any] | None = None
         for criterion in getattr(statement, "_where_criteria", ()):  # type: ignore[attr-defined]
             if not isinstance(criterion, BinaryExpression):
                 continue
@@ -141,18 +159,26 @@ class DummySession:
             value = self._resolve_bound_value(getattr(criterion, "right", None))
             if value is None:
                 continue
-            filtered = [task for task in filtered if getattr(task, "id", None) == value]
-        return filtered
+            task = self._by_id.get(value)
+            if filtered is None:
+                filtered = [task] if task is not None else []
+            else:
+                filtered = [item for item in filtered if item is task]
+        return list(self._tasks) if filtered is None else filtered
 
     async def execute(self, *args: Any, **kwargs: Any) -> DummyResult:
         statement = args[0] if args else None
-        return DummyResult(self._filter_tasks(statement))
+        tasks = self._filter_tasks(statement)
+        if isinstance(statement, Select) and "total" in statement.selected_columns.keys():
+            tasks = [DummyWindowRow(task, len(tasks)) for task in tasks]
+        return DummyResult(tasks)
 
     def add(self, obj: Any) -> None:
         if getattr(obj, "id", None) in (None, 0):
             setattr(obj, "id", self._next_id)
             self._next_id += 1
         self._tasks.append(obj)
+        self._by_id[obj.id] = obj
 
     def add_all(self, objects: list[Any]) -> None:
         for obj in objects:
@@ -160,6 +186,8 @@ class DummySession:
 
     async def delete(self, obj: Any) -> None:
         self._tasks = [task for task in self._tasks if task is not obj]
+        if self._by_id.get(getattr(obj, "id", None)) is obj:
+            del self._by_id[obj.id]
 
     async def commit(self) -> None:
         return None
@@ -2,9 +2,14 @@
 Кэширование с Redis для улучшения производительности
 """
 import json
+import marshal
+import time
+from collections import OrderedDict
 from contextlib import suppress
+from fnmatch import fnmatchcase
 from typing import Optional, Any, Callable
 import redis.asyncio as redis
+from pydantic import BaseModel
 from redis.exceptions import ConnectionError as RedisConnectionError
 from functools import wraps
 import hashlib
@@ -12,8 +17,48 @@ import logging
 
 from app.config import settings
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Размер пачки ключей для SCAN/UNLINK при сбросе кэша по паттерну
+INVALIDATE_BATCH_SIZE = 500
+
+
+def _dumps(value: Any) -> str | bytes:
+    if orjson is not None:
+        try:
+            # orjson отдает bytes - Redis принимает их без кодирования строки
+            return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Например, целые больше 64 бит - stdlib json с ними справляется
+            pass
+    return json.dumps(value)
+
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _serialize(value: Any) -> str | bytes:
+    """Сериализуем в JSON если возможно"""
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    if not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _deserialize(value: str) -> Any:
+    """Пробуем десериализовать JSON, иначе возвращаем строку как есть"""
+    try:
+        return _loads(value)
+    except json.JSONDecodeError:
+        # orjson.JSONDecodeError - подкласс json.JSONDecodeError
+        return value
+
 
 class CacheManager:
     """Менеджер кэширования с Redis"""
@@ -23,6 +68,8 @@ class CacheManager:
         self._connected = False
         self._disabled = False
         self._build_client: Callable[[], redis.Redis] = self._default_build_client
+        # Уже десериализованные значения: ключ -> (момент истечения, значение)
+        self._local: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
 
     def _default_build_client(self) -> redis.Redis:
         """Создать экземпляр клиента Redis."""
@@ -40,6 +87,7 @@ class CacheManager:
         self.redis_client = None
         self._connected = False
         self._disabled = True
+        self._local.clear()
 
     async def connect(self):
         """Подключение к Redis"""
@@ -73,25 +121,90 @@ class CacheManager:
         """Проверка подключения"""
         return self._connected and not self._disabled
 
+    def _local_get(self, key: str) -> Optional[Any]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _remaining_ttl(pttl: int) -> float:
+        """Остаток TTL ключа Redis в секундах (PTTL -1 - ключ без срока)"""
+        return settings.CACHE_LOCAL_TTL if pttl < 0 else pttl / 1000
+
+    def _local_set(self, key: str, value: Any, ttl: float) -> None:
+        ttl = min(ttl, settings.CACHE_LOCAL_TTL)
+        if ttl <= 0:
+            return
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > settings.CACHE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    def invalidate_local(self, pattern: str) -> None:
+        """Сбросить локальный кэш процесса по ключу или glob паттерну"""
+        if pattern in self._local:
+            del self._local[pattern]
+        for key in [key for key in self._local if fnmatchcase(key, pattern)]:
+            del self._local[key]
+
     async def get(self, key: str) -> Optional[Any]:
         """Получить значение из кэша"""
         if not self._connected:
             return None
 
+        value = self._local_get(key)
+        if value is not None:
+            return value
+
         try:
-            value = await self.redis_client.get(key)
+            # Остаток TTL читаем тем же round-trip: L1 не переживает ключ в Redis
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = await pipe.execute()
             if value:
-                # Пробуем десериализовать JSON
-                try:
-                    return json.loads(value)
-                except json.JSONDecodeError:
-                    # Если не JSON, возвращаем как есть
-                    return value
+                value = _deserialize(value)
+                self._local_set(key, value, self._remaining_ttl(pttl))
+                return value
         except Exception as e:
             logger.error(f"Cache get error: {e}")
 
         return None
 
+    async def mget(self, keys: list[str]) -> list[Optional[Any]]:
+        """Получить несколько значений одним MGET (None для отсутствующих)"""
+        if not self._connected or not keys:
+            return [None] * len(keys)
+
+        results = [self._local_get(key) for key in keys]
+        missing = [key for key, value in zip(keys, results) if value is None]
+        if not missing:
+            return results
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.mget(missing)
+                for key in missing:
+                    pipe.pttl(key)
+                values, *pttls = await pipe.execute()
+        except Exception as e:
+            logger.error(f"Cache mget error: {e}")
+            return results
+
+        fetched = {}
+        for key, value, pttl in zip(missing, values, pttls):
+            if value:
+                fetched[key] = _deserialize(value)
+                self._local_set(key, fetched[key], self._remaining_ttl(pttl))
+
+        return [fetched.get(key) if value is None else value for key, value in zip(keys, results)]
+
     async def set(
             self,
             key: str,
@@ -103,24 +216,53 @@ class CacheManager:
             return False
 
         try:
-            # Сериализуем в JSON если возможно
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            elif not isinstance(value, str):
-                value = str(value)
-
             ttl = ttl or settings.REDIS_TTL
-            await self.redis_client.setex(key, ttl, value)
+            serialized = _serialize(value)
+            await self.redis_client.setex(key, ttl, serialized)
+            # В L1 кладем то же, что вернет Redis: "1" -> 1, кортеж -> "(1, 2)",
+            # без ссылки на изменяемый объект вызывающего кода
+            self._local_set(key, _deserialize(serialized), ttl)
             return True
         except Exception as e:
             logger.error(f"Cache set error: {e}")
             return False
 
+    async def mset(self, mapping: dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Сохранить несколько значений за один round-trip (SETEX в pipeline)"""
+        if not self._connected or not mapping:
+            return False
+
+        try:
+            ttl = ttl or settings.REDIS_TTL
+            serialized = {key: _serialize(value) for key, value in mapping.items()}
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in serialized.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+            for key, value in serialized.items():
+                self._local_set(key, _deserialize(value), ttl)
+            return True
+        except Exception as e:
+            logger.error(f"Cache mset error: {e}")
+            return False
+
+    def pipeline(self, transaction: bool = False):
+        """
+        Pipeline Redis для пакета разнородных команд
+
+        Возвращает None, если Redis не подключен - вызывающий код
+        пропускает кэширование, как и при остальных методах.
+        """
+        if not self._connected:
+            return None
+        return self.redis_client.pipeline(transaction=transaction)
+
     async def delete(self, key: str) -> bool:
         """Удалить значение из кэша"""
         if not self._connected:
             return False
 
+        self._local.pop(key, None)
         try:
             await self.redis_client.delete(key)
             return True
@@ -179,18 +321,32 @@ class CacheManager:
         return value
 
     async def invalidate_pattern(self, pattern: str) -> int:
-        """Удалить все ключи по паттерну"""
+        """
+        Удалить все ключи по паттерну
+
+        KEYS блокирует Redis на время обхода всего keyspace, поэтому ключи
+        перебираются курсором SCAN и удаляются пачками через UNLINK
+        (память освобождается в фоновом потоке Redis).
+        """
         if not self._connected:
             return 0
 
+        self.invalidate_local(pattern)
+
+        deleted = 0
+        batch: list[str] = []
         try:
-            keys = await self.redis_client.keys(pattern)
-            if keys:
-                return await self.redis_client.delete(*keys)
+            async for key in self.redis_client.scan_iter(match=pattern, count=INVALIDATE_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= INVALIDATE_BATCH_SIZE:
+                    deleted += await self.redis_client.unlink(*batch)
+                    batch.clear()
+            if batch:
+                deleted += await self.redis_client.unlink(*batch)
         except Exception as e:
             logger.error(f"Cache invalidate pattern error: {e}")
 
-        return 0
+        return deleted
 
     # Методы для работы со списками
     async def lpush(self, key: str, *values) -> int:
@@ -259,6 +415,16 @@ class CacheManager:
         key = f"blacklist:{jti}"
         return await self.set(key, "1", ttl)
 
+    async def invalidate_user(self, user_id: int) -> None:
+        """
+        Сбросить кэш статистики и публичного профиля пользователя.
+
+        Вызывается после любых изменений, влияющих на них: сдачи, награды,
+        покупки, достижения, правки профиля администратором.
+        """
+        await self.delete(CacheKeys.USER_STATS.format(user_id=user_id))
+        await self.delete(CacheKeys.USER_PROFILE.format(user_id=user_id))
+
     async def cache_leaderboard(self, data: list, ttl: int = 300) -> bool:
         """Кэшировать таблицу лидеров"""
         return await self.set("leaderboard", data, ttl)
@@ -272,21 +438,36 @@ class CacheManager:
 cache_manager = CacheManager()
 
 
-def cache_result(key_prefix: str, ttl: int = 300):
+def cache_result(
+        key_prefix: str,
+        ttl: int = 300,
+        key_builder: Optional[Callable[..., str]] = None
+):
     """
-    Декоратор для кэширования результатов функций
+    Декоратор для кэширования результатов функций (cache-aside)
+
+    key_builder получает те же аргументы, что и функция, и возвращает
+    суффикс ключа. Без него ключ - хеш скалярных аргументов. Pydantic
+    модели в результате сохраняются как JSON-совместимые словари.
 
     Usage:
         @cache_result("tasks", ttl=600)
         async def get_tasks(subject: str):
             ...
+
+        @cache_result("user_stats", key_builder=lambda current_user, **_: str(current_user.id))
+        async def get_my_stats(current_user: User, db: AsyncSession):
+            ...
     """
 
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Генерируем ключ на основе аргументов
-            cache_key = f"{key_prefix}:{_generate_cache_key(args, kwargs)}"
+            if key_builder is not None:
+                cache_key = f"{key_prefix}:{key_builder(*args, **kwargs)}"
+            else:
+                cache_key = f"{key_prefix}:{_generate_cache_key(args, kwargs)}"
 
             # Пробуем получить из кэша
             cached = await cache_manager.get(cache_key)
@@ -298,7 +479,7 @@ def cache_result(key_prefix: str, ttl: int = 300):
             result = await func(*args, **kwargs)
 
             # Сохраняем в кэш
-            await cache_manager.set(cache_key, result, ttl)
+            await cache_manager.set(cache_key, _to_cacheable(result), ttl)
             logger.debug(f"Cache miss for {cache_key}, cached for {ttl}s")
 
             return result
@@ -308,26 +489,61 @@ def cache_result(key_prefix: str, ttl: int = 300):
     return decorator
 
 
+def _to_cacheable(value: Any) -> Any:
+    """Привести результат к виду, который можно сохранить как JSON"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, list):
+        return [_to_cacheable(item) for item in value]
+    return value
+
+
+_KEY_SCALAR_TYPES = (str, int, float, bool)
+_KEY_EXACT_TYPES = frozenset(_KEY_SCALAR_TYPES)
+# Версия 2 - без ссылок на повторные объекты (FLAG_REF появился в 3):
+# байты зависят только от значений, а не от счетчиков ссылок
+_KEY_MARSHAL_VERSION = 2
+
+
+def _key_part(value: Any) -> Any:
+    """Привести значение к типу, который принимает marshal"""
+    if type(value) in _KEY_EXACT_TYPES:
+        return value
+    # Подклассы скаляров (str/int Enum) и прочие id marshal не сериализует
+    return ("str", type(value).__name__, str(value))
+
+
 def _generate_cache_key(args: tuple, kwargs: dict) -> str:
-    """Генерация ключа кэша на основе аргументов"""
-    # Создаем строку из аргументов
-    key_parts = []
+    """
+    Генерация ключа кэша на основе аргументов
 
-    # Добавляем позиционные аргументы
+    Части собираются в список и кодируются marshal одним вызовом: это
+    бинарный формат с тегом типа у каждого значения (1, "1" и True дают
+    разные ключи), фиксированной шириной чисел и длиной перед строками,
+    поэтому разбиение на части однозначно при любых символах в значениях.
+    None отделяет позиционные аргументы от именованных.
+    """
+    parts = []
+    append = parts.append
+
+    # Позиционные аргументы
     for arg in args:
-        if isinstance(arg, (str, int, float, bool)):
-            key_parts.append(str(arg))
+        if isinstance(arg, _KEY_SCALAR_TYPES):
+            append(_key_part(arg))
         elif hasattr(arg, 'id'):
-            key_parts.append(f"{type(arg).__name__}:{arg.id}")
+            append(("id", type(arg).__name__, _key_part(arg.id)))
+
+    append(None)
 
-    # Добавляем именованные аргументы
-    for k, v in sorted(kwargs.items()):
-        if isinstance(v, (str, int, float, bool)):
-            key_parts.append(f"{k}:{v}")
+    # Именованные аргументы
+    for k in sorted(kwargs):
+        v = kwargs[k]
+        if isinstance(v, _KEY_SCALAR_TYPES):
+            append(k)
+            append(_key_part(v))
 
-    # Создаем хеш для компактности
-    key_string = ":".join(key_parts)
-    return hashlib.md5(key_string.encode()).hexdigest()
+    data = marshal.dumps(parts, _KEY_MARSHAL_VERSION)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
 class CacheKeys:
@@ -336,11 +552,14 @@ class CacheKeys:
     # Пользователи
     USER = "user:{user_id}"
     USER_STATS = "user:stats:{user_id}"
+    USER_PROFILE = "user:profile:{user_id}"
     USER_SESSION = "session:{user_id}"
 
     # Задания
     TASK = "task:{task_id}"
     TASKS_LIST = "tasks:list:{filters_hash}"
+    TASK_FILTERS = "tasks:filters"
+    TASK_COUNT_ESTIMATE = "tasks:count_estimate"
     TASK_STATS = "task:stats:{task_id}"
 
     # Сдачи
@@ -1,23 +1,72 @@
 """
 Настройка структурированного логирования
 """
+import atexit
+import functools
 import logging
+import logging.handlers
+import queue
 import sys
 import json
-from datetime import datetime
+import time
 from typing import Any, Dict
 from pathlib import Path
 import traceback
 
 from app.config import settings
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
+
+def _iso_utc(created: float) -> str:
+    """
+    ISO время записи из record.created (UTC, миллисекунды)
+
+    Время берется из самой записи - без создания datetime на каждую строку лога.
+    """
+    t = time.gmtime(created)
+    return '%04d-%02d-%02dT%02d:%02d:%02d.%03d' % (
+        t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec,
+        int(created % 1 * 1000)
+    )
+
+
+def _exception_data(exc_info) -> Dict[str, Any]:
+    """Структурированное исключение для JSON и текстового форматтеров"""
+    return {
+        "type": exc_info[0].__name__,
+        "message": str(exc_info[1]),
+        "traceback": traceback.format_exception(*exc_info)
+    }
+
+
+def _record_exception(record: logging.LogRecord) -> Dict[str, Any] | None:
+    """Исключение записи: уже отформатированное в prepare() или из exc_info"""
+    exception = getattr(record, "exception_data", None)
+    if exception is None and record.exc_info:
+        exception = _exception_data(record.exc_info)
+    return exception
+
+
+def _dump_json(data: Dict[str, Any]) -> str:
+    if orjson is not None:
+        try:
+            # orjson пишет UTF-8 как есть, как json.dumps(ensure_ascii=False)
+            return orjson.dumps(data).decode()
+        except TypeError:
+            pass
+    return json.dumps(data, ensure_ascii=False)
+
 
 class JSONFormatter(logging.Formatter):
     """JSON форматтер для структурированного логирования"""
 
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": _iso_utc(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -37,18 +86,15 @@ class JSONFormatter(logging.Formatter):
             log_data["duration_ms"] = record.duration
 
         # Добавляем exception информацию
-        if record.exc_info:
-            log_data["exception"] = {
-                "type": record.exc_info[0].__name__,
-                "message": str(record.exc_info[1]),
-                "traceback": traceback.format_exception(*record.exc_info)
-            }
+        exception = _record_exception(record)
+        if exception is not None:
+            log_data["exception"] = exception
 
         # Добавляем дополнительные данные
         if hasattr(record, "extra_data"):
             log_data["data"] = record.extra_data
 
-        return json.dumps(log_data, ensure_ascii=False)
+        return _dump_json(log_data)
 
 
 class TextFormatter(logging.Formatter):
@@ -70,7 +116,7 @@ class TextFormatter(logging.Formatter):
         reset = self.COLORS['RESET']
 
         # Базовое сообщение
-        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(record.created))
         message = f"{color}[{record.levelname}]{reset} {timestamp} - {record.name} - {record.getMessage()}"
 
         # Добавляем контекст
@@ -89,19 +135,76 @@ class TextFormatter(logging.Formatter):
             message += f" [{', '.join(context_parts)}]"
 
         # Добавляем exception
-        if record.exc_info:
-            message += "\n" + "".join(traceback.format_exception(*record.exc_info))
+        exception = _record_exception(record)
+        if exception is not None:
+            message += "\n" + "".join(exception["traceback"])
 
         return message
 
 
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в потоке приложения
+
+    Стандартный prepare() форматирует запись целиком и убирает exc_info -
+    JSON форматтер потерял бы структурированное исключение. Здесь
+    фиксируется текст сообщения (аргументы могут измениться позже) и
+    traceback: на Python 3.11 форматирование traceback вызывает ast.parse,
+    который нельзя запускать параллельно из потока QueueListener.
+    Остальное форматирование и запись в файлы выполняет поток QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exception_data = _exception_data(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+
+_queue_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.Handler | None = None
+
+
+def stop_logging() -> None:
+    """
+    Дописать записи из очереди и остановить фоновый поток логирования
+
+    Вызывается при остановке приложения, пока stdout еще открыт. Дальше
+    корневой логгер пишет в те же handlers напрямую.
+    """
+    global _queue_listener, _queue_handler
+    if _queue_listener is None:
+        return
+
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _queue_listener.stop()
+    for handler in _queue_listener.handlers:
+        root.addHandler(handler)
+    _queue_listener = None
+    _queue_handler = None
+
+
+# При выходе процесса дописываем то, что осталось в очереди
+atexit.register(stop_logging)
+
+
 def setup_logging() -> logging.Logger:
     """
     Настроить логирование для приложения
 
+    Вызовы логгера в запросах только кладут запись в очередь: вывод в
+    консоль и файлы выполняется в фоновом потоке QueueListener и не
+    блокирует event loop.
+
     Returns:
         Корневой логгер
     """
+    global _queue_listener, _queue_handler
+    stop_logging()
 
     # Создаем директорию для логов
     if settings.LOG_FILE:
@@ -114,6 +217,7 @@ def setup_logging() -> logging.Logger:
 
     # Очищаем существующие handlers
     logger.handlers.clear()
+    handlers = []
 
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
@@ -126,7 +230,7 @@ def setup_logging() -> logging.Logger:
         console_formatter = TextFormatter()
 
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
 
     # File handler (если настроен)
     if settings.LOG_FILE:
@@ -137,7 +241,7 @@ def setup_logging() -> logging.Logger:
         file_formatter = JSONFormatter()
         file_handler.setFormatter(file_formatter)
 
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
 
     # Error file handler
     if settings.LOG_FILE:
@@ -145,7 +249,15 @@ def setup_logging() -> logging.Logger:
         error_handler = logging.FileHandler(error_file)
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(JSONFormatter())
-        logger.addHandler(error_handler)
+        handlers.append(error_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _queue_listener.start()
+    _queue_handler = DeferredFormatQueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
 
     # Настраиваем уровни для сторонних библиотек
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
@@ -274,14 +386,16 @@ def log_performance(
     """Логировать производительность"""
     logger = get_logger("app.performance")
 
+    # Предупреждение для медленных операций
+    level = logging.WARNING if duration_ms > 1000 else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+
     extra = {
         "duration": duration_ms,
         "extra_data": metadata or {}
     }
 
-    # Предупреждение для медленных операций
-    level = logging.WARNING if duration_ms > 1000 else logging.INFO
-
     logger.log(
         level,
         f"Operation '{operation}' took {duration_ms:.2f}ms",
@@ -298,6 +412,8 @@ def log_ai_check(
 ):
     """Логировать AI проверку"""
     logger = get_logger("app.ai")
+    if not logger.isEnabledFor(logging.INFO):
+        return
 
     extra = {
         "duration": processing_time,
@@ -323,6 +439,8 @@ def log_transaction(
 ):
     """Логировать транзакцию"""
     logger = get_logger("app.economy")
+    if not logger.isEnabledFor(logging.INFO):
+        return
 
     extra = {
         "user_id": user_id,
@@ -350,66 +468,51 @@ def log_function_call(logger_name: str = None):
         async def process_task(task_id: int):
             ...
     """
-    import functools
-    import time
-
     def decorator(func):
-        @functools.wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            logger = get_logger(logger_name or func.__module__)
-
-            start_time = time.time()
-
-            try:
-                result = await func(*args, **kwargs)
-                duration = (time.time() - start_time) * 1000
+        logger = get_logger(logger_name or func.__module__)
 
+        def log_completed(start_ns: int) -> None:
+            # Длительность и extra считаем только если DEBUG включен
+            if logger.isEnabledFor(logging.DEBUG):
                 logger.debug(
                     f"Function {func.__name__} completed",
-                    extra={"duration": duration}
+                    extra={"duration": (time.perf_counter_ns() - start_ns) / 1e6}
                 )
 
-                return result
+        def log_failed(start_ns: int) -> None:
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
+            logger.error(
+                f"Function {func.__name__} failed after {duration:.2f}ms",
+                exc_info=True,
+                extra={"duration": duration}
+            )
 
-            except Exception as e:
-                duration = (time.time() - start_time) * 1000
-
-                logger.error(
-                    f"Function {func.__name__} failed after {duration:.2f}ms",
-                    exc_info=True,
-                    extra={"duration": duration}
-                )
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_ns = time.perf_counter_ns()
 
+            try:
+                result = await func(*args, **kwargs)
+            except Exception:
+                log_failed(start_ns)
                 raise
 
+            log_completed(start_ns)
+            return result
+
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            logger = get_logger(logger_name or func.__module__)
-
-            start_time = time.time()
+            start_ns = time.perf_counter_ns()
 
             try:
                 result = func(*args, **kwargs)
-                duration = (time.time() - start_time) * 1000
-
-                logger.debug(
-                    f"Function {func.__name__} completed",
-                    extra={"duration": duration}
-                )
-
-                return result
-
-            except Exception as e:
-                duration = (time.time() - start_time) * 1000
-
-                logger.error(
-                    f"Function {func.__name__} failed after {duration:.2f}ms",
-                    exc_info=True,
-                    extra={"duration": duration}
-                )
-
+            except Exception:
+                log_failed(start_ns)
                 raise
 
+            log_completed(start_ns)
+            return result
+
         # Определяем, асинхронная ли функция
         if asyncio.iscoroutinefunction(func):
             return async_wrapper
@@ -424,6 +527,7 @@ import asyncio
 # Экспортируем основные функции
 __all__ = [
     'setup_logging',
+    'stop_logging',
     'get_logger',
     'get_context_logger',
     'log_request',
@@ -0,0 +1,48 @@
+"""
+Пагинация по курсору (keyset) для сортировки по (created_at, id)
+"""
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Курсор вида <iso_ts>,<id>, указывающий на строку"""
+    return f"{created_at.isoformat()},{row_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Разобрать курсор из encode_cursor
+
+    Некорректный курсор - ошибка клиента, поэтому отвечаем 400,
+    а не пропускаем ValueError из слоя запросов.
+    """
+    created_at, _, row_id = cursor.rpartition(",")
+    try:
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+def rows_before(created_at_column, id_column, cursor: str):
+    """
+    Условие для строк после курсора в порядке (created_at, id) DESC
+
+    Пара сравнивается как row value: база ищет по индексу (..., created_at)
+    вместо просмотра строк OFFSET, а id различает строки с одинаковым временем.
+    """
+    return tuple_(created_at_column, id_column) < decode_cursor(cursor)
+
+
+def next_cursor(rows, limit: int, timestamp_attr: str = "created_at") -> Optional[str]:
+    """Курсор следующей страницы или None, если страница последняя"""
+    if len(rows) < limit or not rows:
+        return None
+    last = rows[-1]
+    return encode_cursor(getattr(last, timestamp_attr), last.id)
@@ -0,0 +1,30 @@
+"""
+JSON ответы API с orjson, если он установлен
+"""
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse, который рендерит тело через orjson
+
+    Класс ответа приложения по умолчанию. ORJSONResponse из FastAPI
+    требует orjson, а он в зависимостях опционален - без него ответ
+    рендерится как обычный JSONResponse.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # Например, целые больше 64 бит - stdlib json с ними справляется
+                pass
+        return super().render(content)
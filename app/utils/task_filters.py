@@ -1,41 +1,35 @@
 """Reusable SQLAlchemy filters for task queries."""
-from typing import Any
-from sqlalchemy import or_
+from sqlalchemy import Boolean, String, cast, func, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 
 from app.models import Task, TaskStatus
-def _status_variants(status: TaskStatus) -> tuple[Any, ...]:
-    """Return a tuple with possible DB representations for ``status``.
-
-    SQLite stores Enum values as plain strings, but depending on the SQLAlchemy
-    version (and even the Python version), that string could be either the
-    Enum's ``name`` (``"ACTIVE"``) or its ``value`` (``"active"``).  Some
-    legacy rows may also store uppercase/lowercase variations of the raw value.
-    To make filtering resilient across environments we generate a small set of
-    acceptable values once and reuse it when building filters.
-    """
 
-    variants: set[Any] = {status}
-    raw_value = getattr(status, "value", None)
-    if isinstance(raw_value, str):
-        variants.add(raw_value)
-        variants.add(raw_value.lower())
-        variants.add(raw_value.upper())
-    raw_name = getattr(status, "name", None)
-    if isinstance(raw_name, str):
-        variants.add(raw_name)
 
-    return tuple(variants)
+class _TaskIsActive(FunctionElement):
+    """Dialect-aware "task is active" predicate (see ``task_is_effectively_active``)."""
 
+    name = "task_is_active"
+    type = Boolean()
+    inherit_cache = True
 
-_ACTIVE_STATUS_VALUES: tuple[Any, ...] = _status_variants(TaskStatus.ACTIVE)
 
+@compiles(_TaskIsActive)
+def _compile_task_is_active(element, compiler, **kw):
+    status_as_text = func.lower(cast(Task.status, String))
+    return compiler.process(
+        or_(
+            Task.status == TaskStatus.ACTIVE,
+            status_as_text == TaskStatus.ACTIVE.value,
+            Task.status.is_(None),
+        ).self_group(),
+        **kw,
+    )
 
-def task_is_effectively_active():
-    """Reusable SQLAlchemy filters for task queries."""
 
-from sqlalchemy import String, cast, func, or_
-
-from app.models import Task, TaskStatus
+@compiles(_TaskIsActive, "postgresql")
+def _compile_task_is_active_postgresql(element, compiler, **kw):
+    return compiler.process(Task.status == TaskStatus.ACTIVE, **kw)
 
 
 def task_is_effectively_active():
@@ -48,11 +42,10 @@ def task_is_effectively_active():
     keep the behaviour stable we compare both against the Enum value and the
     lower-cased textual representation of the column, ensuring every variant of
     "active" is treated as active.
+
+    PostgreSQL stores a native enum, so there the filter compiles to a plain
+    ``status = 'ACTIVE'`` that can use ``idx_task_active_recent``; NULL
+    statuses are backfilled by the 20240607_01 migration.
     """
 
-    status_as_text = func.lower(cast(Task.status, String))
-    return or_(
-        Task.status == TaskStatus.ACTIVE,
-        status_as_text == TaskStatus.ACTIVE.value,
-        Task.status.is_(None),
-    )
\ No newline at end of file
+    return _TaskIsActive()
@@ -9,6 +9,20 @@ from app.models import Task, TaskStatus
 from app.schemas import TaskResponse, TaskListResponse
 from pydantic import ValidationError
 
+# Columns read by ``serialize_task``. Read-only listings select just these as
+# Core rows: no ORM identity map/instance state per row, and the large JSON
+# blobs (criteria, hints, attachments) are never fetched.
+TASK_LIST_COLUMNS = tuple(
+    getattr(Task, name)
+    for name in (
+        "id", "title", "description", "content_html", "task_type", "subject",
+        "topic", "tags", "difficulty", "min_level", "time_limit", "max_attempts",
+        "reward_coins", "reward_exp", "reward_gems", "bonus_coins", "image_url",
+        "video_url", "status", "is_admin_task", "is_premium", "is_featured",
+        "submissions_count", "success_rate", "avg_score", "created_at", "updated_at",
+    )
+)
+
 def _normalize_text(
     value: str | None,
     *,
@@ -280,4 +294,5 @@ def serialize_tasks(tasks: Iterable[Task]) -> List[TaskResponse]:
 def build_task_list(tasks: Iterable[Task]) -> TaskListResponse:
     """Вернуть унифицированный ответ со списком заданий."""
     serialized = serialize_tasks(tasks)
-    return TaskListResponse(items=serialized, total=len(serialized))
\ No newline at end of file
+    # Items are already TaskResponse instances; skip re-validating the wrapper.
+    return TaskListResponse.model_construct(items=serialized, total=len(serialized))
\ No newline at end of file
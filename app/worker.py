@@ -0,0 +1,67 @@
+"""
+Celery воркер для тяжелых фоновых задач (AI проверка работ)
+
+Запуск: celery -A app.worker worker --loglevel=info
+Если CELERY_BROKER_URL не задан или celery не установлен, API
+продолжает обрабатывать сдачи через FastAPI BackgroundTasks.
+"""
+import asyncio
+import logging
+
+from app.config import settings
+
+try:
+    from celery import Celery
+except ImportError:  # pragma: no cover - celery опционален
+    Celery = None
+
+logger = logging.getLogger(__name__)
+
+
+celery_app = None
+if Celery is not None and settings.CELERY_BROKER_URL:
+    celery_app = Celery(
+        "edu",
+        broker=settings.CELERY_BROKER_URL,
+        backend=settings.CELERY_RESULT_BACKEND,
+    )
+    celery_app.conf.update(
+        task_time_limit=settings.CELERY_TASK_TIME_LIMIT,
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+    )
+
+
+def run_submission_check(submission_id: int, file_path: str) -> None:
+    """
+    Выполнить AI проверку сдачи в процессе воркера.
+
+    Воркеры Celery синхронные, поэтому корутину запускаем через
+    asyncio.run. Задание перечитывается по id внутри process_submission -
+    ORM объекты между процессами не передаются.
+    """
+    from app.database import async_engine
+    from app.routers.submissions import process_submission
+    from app.services.ai_checker import ai_checker
+    from app.utils.cache import cache_manager
+
+    async def _run() -> None:
+        # Redis нужен для сброса кэша статистики пользователя после проверки
+        await cache_manager.connect()
+        try:
+            await process_submission(submission_id=submission_id, file_path=file_path)
+        finally:
+            # Соединения пула привязаны к event loop, который закроет asyncio.run
+            await ai_checker.reopen()
+            await cache_manager.disconnect()
+            await async_engine.dispose()
+
+    logger.info(f"Processing submission {submission_id} in worker")
+    asyncio.run(_run())
+
+
+process_submission_task = (
+    celery_app.task(name="submissions.process_submission")(run_submission_check)
+    if celery_app is not None
+    else None
+)
@@ -195,9 +195,9 @@ def test_public_tasks_endpoint_uses_same_serializer(client: TestClient) -> None:
     task = data["items"][0]
     # Ensure the serializer behaviour matches direct invocation
     serialized = serialize_task(DummyTask())
-    assert data[0]["task_type"] == serialized.task_type
-    assert data[0]["subject"] == serialized.subject
-    assert data[0]["status"] == serialized.status
+    assert task["task_type"] == serialized.task_type
+    assert task["subject"] == serialized.subject
+    assert task["status"] == serialized.status
 
 def test_admin_tasks_head_request_returns_total_header(
     client: TestClient,
@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import hashlib
 import os
@@ -80,3 +81,14 @@ def test_verify_password_supports_werkzeug_style_hashes():
     hashed = _make_werkzeug_like_hash(password)
     assert AuthService.verify_password(password, hashed)
     assert not AuthService.verify_password(password + "!", hashed)
+
+
+def test_async_password_helpers_roundtrip():
+    async def roundtrip():
+        hashed = await AuthService.get_password_hash_async("Async123")
+        return (
+            await AuthService.verify_password_async("Async123", hashed),
+            await AuthService.verify_password_async("Async123!", hashed),
+        )
+
+    assert asyncio.run(roundtrip()) == (True, False)
@@ -1,5 +1,6 @@
 """Regression tests for the Redis cache manager."""
 
+import fnmatch
 import sys
 from pathlib import Path
 
@@ -51,3 +52,244 @@ async def test_connect_gracefully_handles_connection_errors(monkeypatch, caplog)
     assert manager.redis_client is None
     assert fake_client.closed
     assert any("Redis unavailable" in record.message for record in caplog.records)
+
+
+@pytest.mark.anyio
+async def test_cache_result_uses_key_builder_and_stores_models(monkeypatch):
+    """key_builder controls the key and pydantic results are cached as dicts."""
+
+    from pydantic import BaseModel
+
+    from app.utils import cache as cache_module
+
+    class Payload(BaseModel):
+        user_id: int
+
+    stored = {}
+
+    async def fake_get(key):
+        return stored.get(key)
+
+    async def fake_set(key, value, ttl=None):
+        stored[key] = value
+        return True
+
+    monkeypatch.setattr(cache_module.cache_manager, "get", fake_get)
+    monkeypatch.setattr(cache_module.cache_manager, "set", fake_set)
+
+    calls = []
+
+    @cache_module.cache_result("stats", key_builder=lambda user_id, **_: str(user_id))
+    async def load(user_id, db=None):
+        calls.append(user_id)
+        return Payload(user_id=user_id)
+
+    await load(user_id=1, db=object())
+    cached = await load(user_id=1, db=object())
+    await load(user_id=2, db=object())
+
+    assert calls == [1, 2]
+    assert cached == {"user_id": 1}
+    assert set(stored) == {"stats:1", "stats:2"}
+
+
+class InMemoryRedisClient:
+    """Minimal in-memory stand-in for the GET/MGET/SETEX/PTTL commands."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def _pttl(self, key):
+        if key not in self.data:
+            return -2
+        return self.ttls[key] * 1000 if key in self.ttls else -1
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.data.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.round_trips += 1
+        self.data[key] = value
+        self.ttls[key] = ttl
+
+    async def delete(self, key):
+        self.round_trips += 1
+        self.data.pop(key, None)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(key) for key in keys]
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def unlink(self, *keys):
+        self.round_trips += 1
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+            def get(self, key):
+                self.commands.append(lambda: client.data.get(key))
+
+            def mget(self, keys):
+                self.commands.append(lambda: [client.data.get(key) for key in keys])
+
+            def pttl(self, key):
+                self.commands.append(lambda: client._pttl(key))
+
+            def setex(self, key, ttl, value):
+                def command():
+                    client.data[key] = value
+                    client.ttls[key] = ttl
+                self.commands.append(command)
+
+            async def execute(self):
+                client.round_trips += 1
+                return [command() for command in self.commands]
+
+        return Pipeline()
+
+
+@pytest.mark.anyio
+async def test_mset_and_mget_batch_round_trips():
+    """mset/mget serialize like set/get but use one round-trip per batch."""
+
+    manager = CacheManager()
+    manager.redis_client = InMemoryRedisClient()
+    manager._connected = True
+
+    assert await manager.mset({"user:1": {"id": 1}, "user:2": [2], "plain": "text"}, ttl=60)
+    values = await manager.mget(["user:1", "missing", "user:2", "plain"])
+
+    assert values == [{"id": 1}, None, [2], "text"]
+    assert manager.redis_client.round_trips == 2
+
+
+@pytest.mark.anyio
+async def test_batch_methods_without_redis():
+    manager = CacheManager()
+
+    assert await manager.mget(["a", "b"]) == [None, None]
+    assert await manager.mset({"a": 1}) is False
+    assert manager.pipeline() is None
+
+
+@pytest.mark.anyio
+async def test_invalidate_pattern_unlinks_matching_keys_in_batches(monkeypatch):
+    from app.utils import cache as cache_module
+
+    monkeypatch.setattr(cache_module, "INVALIDATE_BATCH_SIZE", 2)
+    manager = CacheManager()
+    manager.redis_client = InMemoryRedisClient()
+    manager.redis_client.data = {f"tasks:{i}": "x" for i in range(5)} | {"users:1": "y"}
+    manager._connected = True
+
+    assert await manager.invalidate_pattern("tasks:*") == 5
+    assert set(manager.redis_client.data) == {"users:1"}
+    assert manager.redis_client.round_trips == 3
+
+
+@pytest.mark.anyio
+async def test_local_tier_serves_hot_keys_until_invalidated():
+    manager = CacheManager()
+    manager.redis_client = InMemoryRedisClient()
+    manager._connected = True
+    manager.redis_client.data["stats:1"] = '{"coins": 10}'
+
+    assert await manager.get("stats:1") == {"coins": 10}
+    assert await manager.get("stats:1") == {"coins": 10}
+    assert manager.redis_client.round_trips == 1
+
+    await manager.delete("stats:1")
+    assert await manager.get("stats:1") is None
+
+    await manager.set("tasks:page", {"total": 1})
+    manager.redis_client.data.clear()
+    assert await manager.get("tasks:page") == {"total": 1}
+
+    await manager.invalidate_pattern("tasks:*")
+    assert await manager.get("tasks:page") is None
+
+
+@pytest.mark.anyio
+async def test_local_tier_returns_same_values_as_redis():
+    """L1 holds the deserialized copy, not the caller's object."""
+
+    manager = CacheManager()
+    manager.redis_client = InMemoryRedisClient()
+    manager._connected = True
+
+    payload = {"items": [1, 2]}
+    await manager.set("counter", "1")
+    await manager.mset({"page": payload, "pair": (1, 2)})
+    payload["items"].append(3)
+
+    local = await manager.mget(["counter", "page", "pair"])
+    manager._local.clear()
+    remote = await manager.mget(["counter", "page", "pair"])
+
+    assert local == remote == [1, {"items": [1, 2]}, "(1, 2)"]
+
+
+@pytest.mark.anyio
+async def test_local_tier_does_not_outlive_redis_ttl(monkeypatch):
+    from app.utils import cache as cache_module
+
+    monkeypatch.setattr(cache_module.settings, "CACHE_LOCAL_TTL", 30)
+    manager = CacheManager()
+    manager.redis_client = InMemoryRedisClient()
+    manager._connected = True
+    manager.redis_client.data = {"short": "1", "other": "2", "forever": "3"}
+    manager.redis_client.ttls = {"short": 0.5, "other": 2}
+
+    assert await manager.get("short") == 1
+    assert await manager.mget(["other", "forever"]) == [2, 3]
+    assert manager.redis_client.round_trips == 2
+
+    now = cache_module.time.monotonic()
+    assert manager._local["short"][0] - now <= 0.5
+    assert manager._local["other"][0] - now <= 2
+    assert 2 < manager._local["forever"][0] - now <= 30
+
+
+def test_generated_cache_keys_are_unambiguous():
+    """Types, separators in values and positional/keyword split all affect the key."""
+
+    from app.utils.cache import _generate_cache_key
+
+    class Row:
+        id = 1
+
+    calls = [
+        ((1,), {}),
+        (("1",), {}),
+        ((True,), {}),
+        ((1.0,), {}),
+        ((2 ** 70,), {}),
+        (("a\x1fstr:b",), {}),
+        (("a", "b"), {}),
+        (("limit", 20), {}),
+        ((), {"limit": 20}),
+        ((Row(),), {}),
+    ]
+    keys = {_generate_cache_key(args, kwargs) for args, kwargs in calls}
+
+    assert len(keys) == len(calls)
+    assert _generate_cache_key(("x",), {"b": 2, "a": 1}) == _generate_cache_key(("x",), {"a": 1, "b": 2})
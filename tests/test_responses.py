@@ -0,0 +1,40 @@
+"""Tests for the default JSON response class."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.utils import responses  # noqa: E402
+from app.utils.responses import FastJSONResponse  # noqa: E402
+
+PAYLOAD = {
+    "items": [{"id": 1, "title": "Задание", "score": 87.5, "tags": ["math", None]}],
+    "total": 1,
+    "next_cursor": None,
+}
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_render_matches_stdlib_json_response(monkeypatch, with_orjson: bool) -> None:
+    if not with_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    body = FastJSONResponse(PAYLOAD).body
+
+    assert body == JSONResponse(PAYLOAD).body
+
+
+def test_render_falls_back_for_values_orjson_rejects() -> None:
+    content = {"big": 2 ** 70}
+
+    assert json.loads(FastJSONResponse(content).body) == content
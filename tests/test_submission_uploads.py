@@ -0,0 +1,317 @@
+"""Tests for photo upload validation in the submissions router."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import hashlib
+from io import BytesIO
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.admin_tasks import ensure_optional_deps_stubbed  # noqa: E402
+
+ensure_optional_deps_stubbed()
+
+import pytest  # noqa: E402
+from fastapi import FastAPI, HTTPException, UploadFile  # noqa: E402
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import app.database  # noqa: E402
+from app.auth import get_current_user  # noqa: E402
+from app.database import get_async_db  # noqa: E402
+from app.models import (  # noqa: E402
+    Base, Submission, SubmissionStatus, Task, TaskStatus, Transaction, User, UserRole,
+)
+from app.routers import submissions as submissions_router  # noqa: E402
+from app.services.ai_checker import CheckingQuality, CheckingResult  # noqa: E402
+from app.routers.submissions import save_upload, sniff_image_format  # noqa: E402
+from app.routers.users import sniff_avatar_extension  # noqa: E402
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01", "jpeg"),
+        (b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0d", "png"),
+        (b"RIFF\x24\x00\x00\x00WEBP", "webp"),
+        (b"\x00\x00\x00\x18ftypheic", "heic"),
+        (b"\x00\x00\x00\x1cftypmif1", "heic"),
+    ],
+)
+def test_sniff_image_format_recognizes_supported_images(header: bytes, expected: str) -> None:
+    assert sniff_image_format(header) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        b"",
+        b"%PDF-1.7\n%\xe2\xe3",
+        b"RIFF\x24\x00\x00\x00WAVE",
+        b"\x00\x00\x00\x18ftypisom",
+        b"<html><body>",
+    ],
+)
+def test_sniff_image_format_rejects_non_images(header: bytes) -> None:
+    assert sniff_image_format(header) is None
+
+
+@pytest.mark.anyio
+async def test_save_upload_streams_file_to_disk(tmp_path: Path) -> None:
+    payload = PNG_HEADER + b"\x00" * 200_000
+    target = tmp_path / "photo.png"
+
+    size = await save_upload(UploadFile(BytesIO(payload), filename="photo.png"), str(target))
+
+    assert size == len(payload)
+    assert target.read_bytes() == payload
+
+
+@pytest.mark.anyio
+async def test_save_upload_feeds_hasher_while_streaming(tmp_path: Path) -> None:
+    payload = PNG_HEADER + b"\x01" * 150_000
+    hasher = hashlib.sha256()
+
+    await save_upload(UploadFile(BytesIO(payload), filename="photo.png"), str(tmp_path / "photo.png"), hasher)
+
+    assert hasher.hexdigest() == hashlib.sha256(payload).hexdigest()
+
+
+@pytest.mark.anyio
+async def test_save_upload_rejects_oversized_file(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(submissions_router, "MAX_FILE_SIZE", 1024)
+    target = tmp_path / "photo.png"
+
+    with pytest.raises(HTTPException) as exc_info:
+        await save_upload(UploadFile(BytesIO(PNG_HEADER + b"\x00" * 4096), filename="photo.png"), str(target))
+
+    assert exc_info.value.status_code == 400
+    assert not target.exists()
+
+
+@pytest.mark.anyio
+async def test_save_upload_rejects_non_image(tmp_path: Path) -> None:
+    target = tmp_path / "photo.jpg"
+
+    with pytest.raises(HTTPException) as exc_info:
+        await save_upload(UploadFile(BytesIO(b"%PDF-1.7 fake"), filename="photo.jpg"), str(target))
+
+    assert exc_info.value.status_code == 400
+    assert not target.exists()
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01", ".jpg"),
+        (PNG_HEADER + b"\x00\x00\x00\x0d", ".png"),
+        (b"GIF89a\x01\x00\x01\x00\x80\x00", ".gif"),
+        (b"RIFF\x24\x00\x00\x00WEBP", ".webp"),
+        (b"<svg xmlns='http://www.w3.org/2000/svg'>", None),
+    ],
+)
+def test_sniff_avatar_extension_uses_file_content(header: bytes, expected) -> None:
+    assert sniff_avatar_extension(header) == expected
+
+
+class AsyncSessionWrapper:
+    """Синхронная сессия SQLite за интерфейсом AsyncSession."""
+
+    def __init__(self, session):
+        self._session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def add(self, instance):
+        self._session.add(instance)
+
+    async def execute(self, statement):
+        return await asyncio.to_thread(self._session.execute, statement)
+
+    async def commit(self):
+        await asyncio.to_thread(self._session.commit)
+
+    async def flush(self):
+        await asyncio.to_thread(self._session.flush)
+
+    async def refresh(self, instance):
+        await asyncio.to_thread(self._session.refresh, instance)
+
+    async def rollback(self):
+        await asyncio.to_thread(self._session.rollback)
+
+    async def close(self):
+        await asyncio.to_thread(self._session.close)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def student_and_task(session_factory):
+    with session_factory() as session:
+        student = User(
+            username="student",
+            email="student@example.com",
+            password_hash="hashed",
+            role=UserRole.STUDENT,
+            is_active=True,
+        )
+        task = Task(
+            title="Задание",
+            description="Решите уравнение",
+            task_type="math",
+            status=TaskStatus.ACTIVE,
+        )
+        session.add_all([student, task])
+        session.commit()
+        return student, task.id
+
+
+def build_client(session_factory, user) -> AsyncClient:
+    async def _get_db():
+        async with AsyncSessionWrapper(session_factory()) as db:
+            yield db
+
+    api_app = FastAPI()
+    api_app.include_router(submissions_router.router, prefix="/api/submissions")
+    api_app.dependency_overrides[get_async_db] = _get_db
+    api_app.dependency_overrides[get_current_user] = lambda: user
+    return AsyncClient(transport=ASGITransport(app=api_app), base_url="http://test")
+
+
+@pytest.mark.anyio
+async def test_resubmitting_same_photo_reuses_check_result(
+        tmp_path: Path, monkeypatch, session_factory, student_and_task
+) -> None:
+    student, task_id = student_and_task
+    checker_calls = []
+
+    async def fake_check_photo_submission(**kwargs):
+        checker_calls.append(kwargs)
+        return CheckingResult(
+            recognized_text="x = 2",
+            score=80.0,
+            feedback="Верно",
+            detailed_analysis={},
+            confidence_score=0.9,
+            processing_time=1.5,
+            status="checked",
+            quality_level=CheckingQuality.STANDARD,
+            suggestions=[],
+        )
+
+    monkeypatch.setattr(submissions_router, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(submissions_router, "process_submission_task", None)
+    monkeypatch.setattr(submissions_router.ai_checker, "check_photo_submission", fake_check_photo_submission)
+    monkeypatch.setattr(app.database, "AsyncSessionLocal", lambda: AsyncSessionWrapper(session_factory()))
+
+    photo = PNG_HEADER + b"\x02" * 1024
+    balances = []
+    async with build_client(session_factory, student) as client:
+        for _ in range(2):
+            response = await client.post(
+                "/api/submissions/submit",
+                data={"task_id": str(task_id)},
+                files={"photo": ("photo.png", photo, "image/png")},
+            )
+            assert response.status_code == 202
+            with session_factory() as session:
+                user = session.get(User, student.id)
+                balances.append((user.coins, user.experience, user.tasks_completed))
+
+    assert len(checker_calls) == 1
+    assert balances[1] == balances[0]
+
+    with session_factory() as session:
+        submissions = session.execute(select(Submission).order_by(Submission.id)).scalars().all()
+        transactions = session.execute(select(Transaction)).scalars().all()
+
+    assert [item.attempt_number for item in submissions] == [1, 2]
+    assert all(item.status == SubmissionStatus.CHECKED for item in submissions)
+    assert submissions[1].score == submissions[0].score == 80.0
+    assert submissions[0].coins_earned > 0
+    assert (submissions[1].coins_earned, submissions[1].exp_earned) == (0, 0)
+    assert len(transactions) == 1
+
+
+@pytest.mark.anyio
+async def test_submit_rejects_attempts_over_task_limit(
+        tmp_path: Path, monkeypatch, session_factory, student_and_task
+) -> None:
+    student, task_id = student_and_task
+    with session_factory() as session:
+        session.get(Task, task_id).max_attempts = 1
+        session.add(Submission(user_id=student.id, task_id=task_id, attempt_number=1))
+        session.commit()
+
+    monkeypatch.setattr(submissions_router, "UPLOAD_DIR", str(tmp_path))
+
+    async with build_client(session_factory, student) as client:
+        response = await client.post(
+            "/api/submissions/submit",
+            data={"task_id": str(task_id)},
+            files={"photo": ("photo.png", PNG_HEADER + b"\x03" * 64, "image/png")},
+        )
+
+    assert response.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_my_submissions_cursor_keeps_rows_sharing_timestamp(session_factory, student_and_task) -> None:
+    student, task_id = student_and_task
+    submitted_at = datetime(2024, 6, 1, 12, 0, 0)
+    with session_factory() as session:
+        session.add_all([
+            Submission(
+                user_id=student.id,
+                task_id=task_id,
+                attempt_number=attempt,
+                status=SubmissionStatus.CHECKED,
+                submitted_at=submitted_at,
+            )
+            for attempt in (1, 2, 3)
+        ])
+        session.commit()
+
+    seen = []
+    params = {"limit": 2}
+    async with build_client(session_factory, student) as client:
+        for _ in range(3):
+            response = await client.get("/api/submissions/my-submissions", params=params)
+            assert response.status_code == 200
+            seen.extend(item["id"] for item in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params = {"limit": 2, "after": cursor}
+
+    assert seen == [3, 2, 1]
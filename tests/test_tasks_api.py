@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+from datetime import datetime
 import sys
 import types
 from typing import AsyncGenerator
@@ -290,4 +291,80 @@ async def test_assigned_tasks_only_for_current_user(async_client, seeded_users):
     assert response.status_code == 200
     data = response.json()
     assert data["total"] == 1
-    assert data["items"][0]["title"] == "Личное задание"
\ No newline at end of file
+    assert data["items"][0]["title"] == "Личное задание"
+
+@pytest.mark.anyio
+async def test_task_filters_return_active_subjects_and_types(async_client, seeded_users):
+    session = SessionLocal()
+    try:
+        await asyncio.to_thread(session.execute, delete(TaskAssignment))
+        await asyncio.to_thread(session.execute, delete(Task))
+        session.add_all([
+            Task(
+                title="Алгебра",
+                description="Задание по алгебре для фильтров",
+                task_type="math",
+                subject="Математика",
+                status=TaskStatus.ACTIVE,
+            ),
+            Task(
+                title="Эссе",
+                description="Задание по литературе для фильтров",
+                task_type="essay",
+                status=TaskStatus.ACTIVE,
+            ),
+            Task(
+                title="Архив",
+                description="Архивное задание не попадает в фильтры",
+                task_type="archived-type",
+                subject="История",
+                status=TaskStatus.ARCHIVED,
+            ),
+        ])
+        await asyncio.to_thread(session.commit)
+    finally:
+        await asyncio.to_thread(session.close)
+
+    response = await async_client.get("/api/tasks/filters")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["subjects"] == ["Математика"]
+    assert sorted(data["types"]) == ["essay", "math"]
+
+    response = await async_client.get("/api/tasks/subjects/list")
+    assert response.json() == ["Математика"]
+
+
+@pytest.mark.anyio
+async def test_public_task_list_paginates_with_cursor(async_client, seeded_users):
+    session = SessionLocal()
+    try:
+        await asyncio.to_thread(session.execute, delete(TaskAssignment))
+        await asyncio.to_thread(session.execute, delete(Task))
+        session.add_all([
+            Task(
+                title=f"Задание {index}",
+                description=f"Описание задания для курсора {index}",
+                task_type="math",
+                status=TaskStatus.ACTIVE,
+                created_at=datetime(2024, 1, index),
+            )
+            for index in range(1, 4)
+        ])
+        await asyncio.to_thread(session.commit)
+    finally:
+        await asyncio.to_thread(session.close)
+
+    first_page = (await async_client.get("/api/tasks", params={"limit": 2})).json()
+    assert [item["title"] for item in first_page["items"]] == ["Задание 3", "Задание 2"]
+    assert first_page["next_cursor"]
+
+    second_page = (
+        await async_client.get("/api/tasks", params={"limit": 2, "after": first_page["next_cursor"]})
+    ).json()
+    assert [item["title"] for item in second_page["items"]] == ["Задание 1"]
+    assert second_page["total"] == 3
+    assert second_page["next_cursor"] is None
+
+    response = await async_client.get("/api/tasks", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+"""Tests for running submission checks in the Celery worker."""
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.utils.admin_tasks import ensure_optional_deps_stubbed  # noqa: E402
+
+ensure_optional_deps_stubbed()
+
+from app.config import settings  # noqa: E402
+from app.routers import submissions as submissions_router  # noqa: E402
+from app.services import ai_checker as ai_checker_module  # noqa: E402
+from app.utils.cache import cache_manager  # noqa: E402
+from app.worker import run_submission_check  # noqa: E402
+
+
+class FakeOpenAI:
+    def __init__(self, **kwargs) -> None:
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_back_to_back_tasks_get_fresh_openai_client(monkeypatch) -> None:
+    monkeypatch.setattr(ai_checker_module, "AsyncOpenAI", FakeOpenAI)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "OPENAI_MAX_CONCURRENCY", 1)
+    checker = ai_checker_module.AIPhotoChecker()
+    monkeypatch.setattr(ai_checker_module, "ai_checker", checker)
+
+    async def _noop() -> None:
+        return None
+
+    monkeypatch.setattr(cache_manager, "connect", _noop)
+    monkeypatch.setattr(cache_manager, "disconnect", _noop)
+
+    seen = []
+
+    async def fake_process_submission(submission_id: int, file_path: str) -> None:
+        seen.append((checker.client, checker._openai_slots))
+
+        # Под конкуренцией семафор привязывается к текущему event loop
+        async def _hold_slot() -> None:
+            async with checker._openai_slots:
+                await asyncio.sleep(0)
+
+        await asyncio.gather(_hold_slot(), _hold_slot())
+
+    monkeypatch.setattr(submissions_router, "process_submission", fake_process_submission)
+
+    run_submission_check(1, "uploads/submissions/first.png")
+    run_submission_check(2, "uploads/submissions/second.png")
+
+    (first_client, first_slots), (second_client, second_slots) = seen
+    assert first_client.closed
+    assert second_client is not first_client
+    assert second_slots is not first_slots
+
+
+def test_aclose_does_not_open_a_new_client(monkeypatch) -> None:
+    monkeypatch.setattr(ai_checker_module, "AsyncOpenAI", FakeOpenAI)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    checker = ai_checker_module.AIPhotoChecker()
+    client = checker.client
+
+    asyncio.run(checker.aclose())
+
+    assert client.closed
+    assert checker.client is client